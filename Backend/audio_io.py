@@ -1,51 +1,241 @@
 # noise_cleanse/audio_io.py
 
+import hashlib
+import logging
 import os
+import threading
+import warnings
+from functools import lru_cache
+
 import numpy as np
-import sounddevice as sd
-from scipy.io import wavfile
+import soundfile as sf
+
+from . import config, resampler
+from .devices import sounddevice
+
+logger = logging.getLogger(__name__)
+
+
+def peak(signal: np.ndarray, chunk: int = config.AUDIO_CHUNK) -> float:
+    """max(|signal|), scanned in chunks so no full-size temporary is allocated."""
+    value = 0.0
+    for start in range(0, len(signal), chunk):
+        block = signal[start:start + chunk]
+        value = max(value, float(np.max(block)), -float(np.min(block)))
+    return value
+
+
+def _to_float(block: np.ndarray) -> np.ndarray:
+    """PCM or float samples as float32 in [-1, 1]."""
+    if block.dtype == np.uint8:
+        return (block.astype(np.float32) - 128.0) / 128.0
+    if block.dtype.kind == "i":
+        return block.astype(np.float32) / float(-np.iinfo(block.dtype).min)
+    return block.astype(np.float32, copy=False)
+
+
+@lru_cache(maxsize=config.AUDIO_PEAK_CACHE_SIZE)
+def _file_peak(path: str, size: int, mtime_ns: int) -> float:
+    with AudioSource(path) as src:
+        return max((peak(block) for block in src.chunks()), default=0.0)
+
+
+@lru_cache(maxsize=config.AUDIO_PEAK_CACHE_SIZE)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    h = hashlib.sha1()
+    with AudioSource(path) as src:
+        for block in src.chunks():
+            h.update(np.ascontiguousarray(block))
+    return h.hexdigest()
+
+
+def file_digest(path) -> str:
+    """SHA-1 of a file's samples as interleaved float32, computed once per file version."""
+    st = os.stat(path)
+    return _file_digest(os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+class AudioSource:
+    """
+    Lazy, read-only view of an audio file. WAV data is memory-mapped; other
+    formats (and WAV encodings numpy cannot map, e.g. 24-bit) are read in
+    blocks through soundfile. Reads return float32 in [-1, 1], 1-D for mono
+    and (frames, channels) otherwise, or one channel with `channel`.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._data = None
+        self._file = None
+        self._lock = threading.Lock()
+        try:
+            from scipy.io import wavfile
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", wavfile.WavFileWarning)   # e.g. PEAK chunks
+                self.fs, self._data = wavfile.read(self.path, mmap=True)
+            self.frames = len(self._data)
+            self.channels = 1 if self._data.ndim == 1 else self._data.shape[1]
+        except ValueError:
+            self._file = sf.SoundFile(self.path)
+            self.fs, self.frames, self.channels = self._file.samplerate, self._file.frames, self._file.channels
+
+    @classmethod
+    def from_array(cls, data: np.ndarray, fs: int):
+        """Source over samples already in memory (1-D or frames x channels)."""
+        src = cls.__new__(cls)
+        src.path, src._file, src._lock = None, None, threading.Lock()
+        src.fs, src._data = fs, np.asarray(data)
+        src.frames = len(src._data)
+        src.channels = 1 if src._data.ndim == 1 else src._data.shape[1]
+        return src
+
+    def __len__(self) -> int:
+        return self.frames
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.fs
+
+    @property
+    def peak(self) -> float:
+        """Peak absolute sample value, computed once per file version."""
+        if self.path is None:
+            return peak(_to_float(self._data))
+        st = os.stat(self.path)
+        return _file_peak(os.path.realpath(self.path), st.st_size, st.st_mtime_ns)
+
+    def read(self, start: int = 0, stop: int = None, channel: int = None) -> np.ndarray:
+        start = max(0, start)
+        stop = self.frames if stop is None else min(stop, self.frames)
+        count = max(0, stop - start)
+        if self._data is not None:
+            block = self._data[start:start + count]
+            if channel is not None and block.ndim > 1:
+                block = block[:, channel]
+            return _to_float(block)
+        with self._lock:
+            self._file.seek(start)
+            block = self._file.read(count, dtype="float32", always_2d=channel is not None)
+        return block[:, channel] if channel is not None else block
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.frames)
+            block = self.read(start, stop)
+            return block if step == 1 else block[::step]
+        index = range(self.frames)[key]
+        return self.read(index, index + 1)[0]
+
+    def chunks(self, size: int = config.AUDIO_CHUNK, start: int = 0, stop: int = None, channel: int = None):
+        """Yield consecutive float32 blocks of at most `size` frames."""
+        stop = self.frames if stop is None else min(stop, self.frames)
+        for pos in range(start, stop, size):
+            yield self.read(pos, min(pos + size, stop), channel)
+
+    def close(self):
+        self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AudioWriter:
+    """
+    Chunked audio file writer (format from the extension, `subtype` as in
+    soundfile). Tracks the peak written; with `normalize`, the file is
+    rescaled to a peak of 1 in a second chunked pass on close.
+    """
+
+    def __init__(self, path, fs: int, channels: int = 1, subtype: str = None,
+                 normalize: bool = False, scale: float = 1.0):
+        self.path = str(path)
+        self.fs = fs
+        self.normalize = normalize
+        self.scale = scale
+        self.peak = 0.0
+        self.frames = 0
+        self._file = sf.SoundFile(self.path, "w", samplerate=fs, channels=channels, subtype=subtype)
+
+    def write(self, block: np.ndarray):
+        block = np.asarray(block, dtype=np.float32)
+        if self.scale != 1.0:
+            block = block * np.float32(self.scale)
+        if len(block):
+            self.peak = max(self.peak, peak(block))
+        self._file.write(block)
+        self.frames += len(block)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if self.normalize and self.peak > 0:
+            gain = np.float32(1.0 / self.peak)
+            with sf.SoundFile(self.path, "r+") as f:
+                for pos in range(0, self.frames, config.AUDIO_CHUNK):
+                    f.seek(pos)
+                    block = f.read(config.AUDIO_CHUNK, dtype="float32")
+                    f.seek(pos)
+                    f.write(block * gain)
+            self.peak = 1.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 def record_audio(filename: str, duration: float, fs: int = 44100):
     """Record audio from the default input device and save as WAV."""
-    print(f"Recording for {duration} seconds at {fs} Hz...")
+    from scipy.io import wavfile
+    sd = sounddevice()
+    logger.info("Recording for %s seconds at %d Hz...", duration, fs)
     recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='float32')
     sd.wait()
     recording = np.squeeze(recording)
     recording = recording / np.max(np.abs(recording) + 1e-9)
     wavfile.write(filename, fs, recording)
-    print(f"Recording saved to {filename}")
+    logger.info("Recording saved to %s", filename)
     return recording
 
 
 def play_audio(filename: str):
     """Play a WAV file through the default output device."""
-    fs, data = wavfile.read(filename)
-    if data.dtype != np.float32:
-        data = data.astype(np.float32) / np.max(np.abs(data))
-    print(f"Playing {filename}...")
+    sd = sounddevice()
+    with AudioSource(filename) as src:
+        fs, data = src.fs, src.read()
+    logger.info("Playing %s...", filename)
     sd.play(data, samplerate=fs)
     sd.wait()
 
 
 def save_audio(filename: str, signal: np.ndarray, fs: int):
-    """Save a numpy array as a WAV file."""
-    signal = signal / (np.max(np.abs(signal)) + 1e-9)
-    signal = np.squeeze(signal).astype(np.float32)
-    wavfile.write(filename, fs, signal)
-    print(f"Saved audio to {filename}")
+    """Save a numpy array as a peak-normalised float WAV file, chunk by chunk."""
+    signal = np.squeeze(signal)
+    channels = 1 if signal.ndim == 1 else signal.shape[1]
+    with AudioWriter(filename, fs, channels, subtype="FLOAT", scale=1.0 / (peak(signal) + 1e-9)) as out:
+        for start in range(0, len(signal), config.AUDIO_CHUNK):
+            out.write(signal[start:start + config.AUDIO_CHUNK])
+    logger.debug("Saved audio to %s", filename)
 
 
 def load_audio(filename: str, target_fs: int = None):
-    """Load a WAV file and optionally resample it."""
-    fs, data = wavfile.read(filename)
-    data = np.squeeze(data).astype(np.float32)
-    if np.max(np.abs(data)) > 0:
-        data /= np.max(np.abs(data))
+    """Load an audio file as peak-normalised float32 and optionally resample it."""
+    with AudioSource(filename) as src:
+        fs, data, data_peak = src.fs, src.read(), src.peak
+    data = np.asarray(np.squeeze(data))   # plain array; float WAVs are a copy-on-write mapping
+    if data_peak > 0:
+        data *= np.float32(1.0 / data_peak)
     if target_fs is not None and fs != target_fs:
-        from scipy.signal import resample
-        num_samples = int(len(data) * target_fs / fs)
-        data = resample(data, num_samples)
+        data = resampler.resample(data, fs, target_fs).astype(np.float32, copy=False)
         fs = target_fs
-    print(f"Loaded {filename} at {fs} Hz")
+    logger.debug("Loaded %s at %d Hz", filename, fs)
     return data, fs
@@ -0,0 +1,355 @@
+# noise_cleanse/benchmark.py
+
+"""
+Performance benchmark for the NoiseCleanse DSP pipeline.
+
+Builds synthetic rooms (exponentially decaying noise IRs convolved with
+synthetic speech or noise) at several lengths and sample rates, times every
+processing stage, and reports realtime factor and peak memory. Results can be
+saved as a baseline and later runs compared against it. No sound device is
+opened: the live path is exercised by driving the audio callback directly.
+
+    python -m Backend.benchmark --quick
+    python -m Backend.benchmark --save-baseline benchmarks/baseline.json
+    python -m Backend.benchmark --baseline benchmarks/baseline.json
+    python -m Backend.benchmark --quick --precision   # single-precision accuracy/memory
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from . import config, fft_engine, impulse_response, offline_deconvolution, live_deconvolution
+
+DEFAULT_RATES = (16000, 44100, 48000)
+DEFAULT_LENGTHS = (5.0, 30.0, 120.0)
+QUICK_RATES = (44100,)
+QUICK_LENGTHS = (5.0,)
+
+# Modules the API should only load on first use
+HEAVY_MODULES = ("sounddevice", "matplotlib", "scipy.signal", "scipy.linalg", "scipy.fft", "scipy.io")
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import Backend.restAPIBackend
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+# ---------------------------------------------------------------------------
+#  Synthetic rooms
+# ---------------------------------------------------------------------------
+def synthetic_ir(fs: int, rt60: float = 0.4, rng=None) -> np.ndarray:
+    """Exponentially decaying noise IR with a direct-path impulse."""
+    rng = rng or np.random.default_rng(0)
+    n = int(rt60 * fs)
+    t = np.arange(n) / fs
+    ir = rng.standard_normal(n) * np.exp(-6.9 * t / rt60) * 0.3
+    ir[0] = 1.0
+    return ir / np.max(np.abs(ir))
+
+
+def synthetic_speech(fs: int, seconds: float, rng=None) -> np.ndarray:
+    """Speech-like source: glottal harmonics under a syllabic envelope plus breath noise."""
+    rng = rng or np.random.default_rng(1)
+    n = int(seconds * fs)
+    t = np.arange(n) / fs
+    f0 = 120 + 20 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / fs
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None) ** 2
+    signal = voiced * envelope + 0.02 * rng.standard_normal(n)
+    return signal / np.max(np.abs(signal))
+
+
+def synthetic_noise(fs: int, seconds: float, rng=None) -> np.ndarray:
+    rng = rng or np.random.default_rng(2)
+    return rng.standard_normal(int(seconds * fs)) * 0.1
+
+
+def synthetic_room(fs: int, seconds: float, source: str = "speech"):
+    """Return (reverberant recording, room IR)."""
+    ir = synthetic_ir(fs)
+    dry = synthetic_speech(fs, seconds) if source == "speech" else synthetic_noise(fs, seconds)
+    wet = fftconvolve(dry, ir)[:len(dry)]
+    return wet / np.max(np.abs(wet)), ir
+
+
+# ---------------------------------------------------------------------------
+#  Measurement
+# ---------------------------------------------------------------------------
+def measure(fn, repeats: int = 3) -> dict:
+    """Best wall time over `repeats` runs and peak traced memory of one run."""
+    times = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_mb": peak / 2**20}
+
+
+def simulate_callback(ir_pre: np.ndarray, fs: int, seconds: float) -> dict:
+    """Drive LiveSession.audio_callback block by block, without a stream."""
+    session = live_deconvolution.LiveSession("benchmark")
+    with contextlib.redirect_stdout(io.StringIO()):
+        session.inverse_fir = live_deconvolution.get_inverse_fir(ir_pre, config.LIVE_INV_LENGTH)
+    session.convolver = live_deconvolution._make_convolver(session.inverse_fir)
+    session.fs = fs
+
+    B = config.LIVE_FRAME_SIZE
+    n_blocks = max(1, int(seconds * fs) // B)
+    indata = (np.random.default_rng(3).standard_normal((B, 1)) * 0.1).astype(np.float32)
+    outdata = np.zeros((B, 1), dtype=np.float32)
+    deadline = B / fs
+    worst = 0.0
+    misses = 0
+    start = time.perf_counter()
+    for _ in range(n_blocks):
+        t0 = time.perf_counter()
+        session.audio_callback(indata, outdata, B, None, None)
+        elapsed = time.perf_counter() - t0
+        worst = max(worst, elapsed)
+        misses += elapsed > deadline
+    total = time.perf_counter() - start
+    return {
+        "seconds": total,
+        "per_block_ms": 1e3 * total / n_blocks,
+        "worst_block_ms": 1e3 * worst,
+        "deadline_ms": 1e3 * deadline,
+        "deadline_misses": int(misses),
+    }
+
+
+def measure_startup(repeats: int = 3) -> dict:
+    """Cold import time of the REST API in fresh headless interpreters, and heavy modules it loaded."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, NOISECLEANSE_HEADLESS="1",
+               PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get("PYTHONPATH")))))
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="noisecleanse_start_") as cwd:
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT % (HEAVY_MODULES,)],
+                                 cwd=cwd, env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        created = os.listdir(cwd)
+    return {
+        "seconds": min(r["seconds"] for r in runs),
+        "loaded": runs[0]["loaded"],
+        "created": created,
+    }
+
+
+def run_suite(rates, lengths, repeats: int = 3, source: str = "speech") -> list:
+    """Time API startup, then every stage for each (sample rate, length) room; returns result rows."""
+    startup = measure_startup(repeats)
+    rows = [{
+        "stage": "api_startup", "fs": 0, "length_s": 0,
+        "seconds": startup["seconds"], "peak_mb": None, "realtime_factor": None,
+        "loaded_modules": startup["loaded"], "created_paths": startup["created"],
+    }]
+    tmp_dir = tempfile.TemporaryDirectory(prefix="noisecleanse_bench_")
+    tmp = tmp_dir.name
+    saved_paths = (config.SWEEP_FILE, config.IR_FILE)
+    config.SWEEP_FILE = os.path.join(tmp, "sweep.wav")
+    config.IR_FILE = os.path.join(tmp, "ir.wav")
+    try:
+        for fs in rates:
+            for seconds in lengths:
+                recorded, room_ir = synthetic_room(fs, seconds, source)
+                sweep_seconds = min(seconds, config.SWEEP_DURATION)
+                f_end = min(config.FREQ_END, fs / 2 - 1)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    sweep = impulse_response.generate_sweep(fs, sweep_seconds, config.FREQ_START, f_end)
+                    sweep_rec = fftconvolve(sweep, room_ir)
+                    ir_pre = impulse_response.preprocess_ir(room_ir, fs)
+                    recovered = offline_deconvolution.offline_deconvolve(recorded, ir_pre, fs)
+
+                stages = {
+                    "generate_sweep": (sweep_seconds, lambda: impulse_response.generate_sweep(
+                        fs, sweep_seconds, config.FREQ_START, f_end)),
+                    "extract_ir": (sweep_seconds, lambda: impulse_response.extract_ir(
+                        sweep_rec, sweep, fs, config.FREQ_START, f_end)),
+                    "preprocess_ir": (len(room_ir) / fs, lambda: impulse_response.preprocess_ir(room_ir, fs)),
+                    "spectral_division": (seconds, lambda: offline_deconvolution.spectral_division(
+                        recorded, ir_pre, fs, config.OFFLINE_LAMBDA)),
+                    "mmse_deconvolve": (seconds, lambda: offline_deconvolution.mmse_deconvolve(recorded, ir_pre, fs)),
+                    "offline_deconvolve": (seconds, lambda: offline_deconvolution.offline_deconvolve(recorded, ir_pre, fs)),
+                    "apply_spectral_gating": (seconds, lambda: offline_deconvolution.apply_spectral_gating(recovered, fs)),
+                    "apply_notch_filters": (seconds, lambda: offline_deconvolution.apply_notch_filters(recovered, fs)),
+                    "compute_inverse_fir": (None, lambda: live_deconvolution.compute_inverse_fir(
+                        ir_pre, config.LIVE_INV_LENGTH, method=config.INV_FIR_METHOD)),
+                }
+                for stage, (audio_seconds, fn) in stages.items():
+                    m = measure(fn, repeats)
+                    rows.append({
+                        "stage": stage, "fs": fs, "length_s": seconds,
+                        "seconds": m["seconds"], "peak_mb": m["peak_mb"],
+                        "realtime_factor": audio_seconds / m["seconds"] if audio_seconds else None,
+                    })
+
+                cb = simulate_callback(ir_pre, fs, seconds)
+                rows.append({
+                    "stage": "audio_callback", "fs": fs, "length_s": seconds,
+                    "seconds": cb["seconds"], "peak_mb": None,
+                    "realtime_factor": seconds / cb["seconds"],
+                    "per_block_ms": cb["per_block_ms"], "worst_block_ms": cb["worst_block_ms"],
+                    "deadline_misses": cb["deadline_misses"],
+                })
+    finally:
+        config.SWEEP_FILE, config.IR_FILE = saved_paths
+        tmp_dir.cleanup()
+    return rows
+
+
+def precision_rows(rates, lengths, repeats: int = 3, source: str = "speech") -> list:
+    """
+    Time the offline stages at single precision and report their accuracy
+    (SNR of the difference) against the same stages at double precision.
+    """
+    stages = {
+        "offline_deconvolve": lambda x, ir, fs: offline_deconvolution.offline_deconvolve(x, ir, fs),
+        "offline_deconvolve_stream": lambda x, ir, fs: np.concatenate(list(
+            offline_deconvolution.offline_deconvolve_stream(
+                (x[i:i + config.STREAM_BLOCK_SIZE] for i in range(0, len(x), config.STREAM_BLOCK_SIZE)), ir, fs))),
+        "apply_spectral_gating": lambda x, ir, fs: offline_deconvolution.apply_spectral_gating(x, fs),
+        "apply_notch_filters": lambda x, ir, fs: offline_deconvolution.apply_notch_filters(x, fs),
+        "apply_filters": lambda x, ir, fs: offline_deconvolution.apply_filters(x, fs),
+    }
+    saved = fft_engine.get_backend()["precision"]
+    rows = []
+    try:
+        for fs in rates:
+            for seconds in lengths:
+                recorded, room_ir = synthetic_room(fs, seconds, source)
+                ir_pre = impulse_response.preprocess_ir(room_ir, fs)
+                for stage, fn in stages.items():
+                    # Stages after deconvolution take the deconvolved signal as input
+                    fft_engine.set_precision("double")
+                    x = recorded if stage.startswith("offline") else \
+                        offline_deconvolution.offline_deconvolve(recorded, ir_pre, fs)
+                    reference = fn(x, ir_pre, fs)
+                    fft_engine.set_precision("single")
+                    x = x.astype(np.float32)
+                    result = fn(x, ir_pre, fs)
+                    m = measure(lambda: fn(x, ir_pre, fs), repeats)
+                    err = np.linalg.norm(result - reference) / (np.linalg.norm(reference) + 1e-30)
+                    rows.append({
+                        "stage": f"{stage}:single", "fs": fs, "length_s": seconds,
+                        "seconds": m["seconds"], "peak_mb": m["peak_mb"],
+                        "realtime_factor": seconds / m["seconds"],
+                        "snr_db": -20 * np.log10(err) if err > 0 else float("inf"),
+                        "max_abs_err": float(np.max(np.abs(result - reference))),
+                    })
+    finally:
+        fft_engine.set_precision(saved)
+    return rows
+
+
+# ---------------------------------------------------------------------------
+#  Baselines and reporting
+# ---------------------------------------------------------------------------
+def _key(row: dict) -> str:
+    return f"{row['stage']}@{row['fs']}Hz/{row['length_s']:g}s"
+
+
+def compare(rows: list, baseline: dict, tolerance: float) -> list:
+    """Rows slower than the baseline by more than `tolerance` (fractional)."""
+    reference = {_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for row in rows:
+        ref = reference.get(_key(row))
+        if ref is None or ref["seconds"] <= 0:
+            continue
+        ratio = row["seconds"] / ref["seconds"]
+        row["vs_baseline"] = ratio
+        if ratio > 1.0 + tolerance:
+            regressions.append(row)
+    return regressions
+
+
+def print_report(rows: list):
+    print(f"{'stage':<30}{'fs':>7}{'len s':>7}{'time ms':>11}{'x realtime':>12}{'peak MB':>10}{'vs base':>9}")
+    for row in rows:
+        rtf = f"{row['realtime_factor']:.1f}" if row["realtime_factor"] else "-"
+        peak = f"{row['peak_mb']:.1f}" if row["peak_mb"] is not None else "-"
+        base = f"{row['vs_baseline']:.2f}" if "vs_baseline" in row else "-"
+        print(f"{row['stage']:<30}{row['fs']:>7}{row['length_s']:>7g}{1e3 * row['seconds']:>11.2f}{rtf:>12}{peak:>10}{base:>9}")
+        if row["stage"] == "api_startup":
+            print(f"{'':<30}eagerly loaded: {', '.join(row['loaded_modules']) or 'none'}; "
+                  f"paths created on import: {', '.join(row['created_paths']) or 'none'}")
+        if "snr_db" in row:
+            print(f"{'':<30}vs double: SNR {row['snr_db']:.1f} dB, max abs error {row['max_abs_err']:.2e}")
+        if row["stage"] == "audio_callback":
+            print(f"{'':<30}per block {row['per_block_ms']:.3f} ms, worst {row['worst_block_ms']:.3f} ms, "
+                  f"deadline misses {row['deadline_misses']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the NoiseCleanse DSP pipeline (headless).")
+    parser.add_argument("--quick", action="store_true", help="one sample rate, one short length")
+    parser.add_argument("--rates", type=int, nargs="+", help="sample rates in Hz")
+    parser.add_argument("--lengths", type=float, nargs="+", help="recording lengths in seconds")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--source", choices=("speech", "noise"), default="speech")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write results as a baseline JSON")
+    parser.add_argument("--precision", action="store_true",
+                        help="also run the offline stages at single precision and report accuracy vs double")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    rates = args.rates or (QUICK_RATES if args.quick else DEFAULT_RATES)
+    lengths = args.lengths or (QUICK_LENGTHS if args.quick else DEFAULT_LENGTHS)
+    rows = run_suite(rates, lengths, args.repeats, args.source)
+    if args.precision:
+        rows += precision_rows(rates, lengths, args.repeats, args.source)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+    print_report(rows)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "fft_backend": config.FFT_BACKEND,
+                "precision": config.PRECISION,
+                "results": rows,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for row in regressions:
+            print(f"  {_key(row)}: {row['vs_baseline']:.2f}x baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# noise_cleanse/cache.py
+
+"""
+Content-addressed array caches.
+
+Arrays are keyed by a hash of their inputs, kept in an in-memory LRU and
+optionally mirrored to `.npy` files so they survive a server restart.
+FileCache keeps whole files (e.g. rendered results) under a byte budget.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def content_key(*parts) -> str:
+    """Hash arrays and scalar parameters into a stable hex key."""
+    h = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            arr = np.ascontiguousarray(part)
+            h.update(str(arr.dtype).encode())
+            h.update(str(arr.shape).encode())
+            h.update(arr.tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+class ArrayCache:
+    """
+    Thread-safe LRU of numpy arrays with an optional on-disk `.npy` tier.
+    Entries are evicted beyond `max_entries` and, if set, `max_bytes` in total.
+    """
+
+    def __init__(self, max_entries: int = 32, disk_dir: str = None, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key: str):
+        if self.disk_dir is None:
+            return None
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def get(self, key: str):
+        """Return the cached array for `key`, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        path = self._disk_path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                value = np.load(path)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: np.ndarray, copy: bool = True) -> np.ndarray:
+        """
+        Store a read-only copy of `value` in memory (and on disk if enabled) and
+        return it. With `copy=False` the cache takes ownership of `value` and
+        freezes it in place, so the caller must not keep writing to it.
+        """
+        value = self._store(key, np.array(value, copy=True) if copy else np.asarray(value))
+        path = self._disk_path(key)
+        if path is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.disk_dir)   # unique across pool workers
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, value)
+            os.replace(tmp, path)
+        return value
+
+    def get_or_compute(self, key: str, compute):
+        """Return the cached array for `key`, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute(), copy=False)   # a fresh result, not shared with anyone
+        return value
+
+    def _store(self, key: str, value: np.ndarray) -> np.ndarray:
+        value.setflags(write=False)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            self._bytes -= 0 if old is None else old.nbytes
+            self._entries[key] = value
+            self._bytes += value.nbytes
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes and len(self._entries) > 1):
+                self._bytes -= self._entries.popitem(last=False)[1].nbytes
+        return value
+
+    def clear(self, disk: bool = False):
+        """Drop all in-memory entries, and the `.npy` files too if `disk` is set."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if disk and self.disk_dir is not None and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.disk_dir, name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+class FileCache:
+    """
+    Directory of `<key><suffix>` files kept under `max_bytes` in total, evicting
+    the least recently used. Files are produced elsewhere and adopted with
+    `commit`; after a restart, use order starts from the files' mtimes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._index = None   # key -> [size, last use], loaded from the directory on first use
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _load_locked(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(self.suffix) and ".tmp" not in entry.name:
+                    st = entry.stat()
+                    self._index[entry.name[:len(entry.name) - len(self.suffix)]] = [st.st_size, st.st_mtime]
+
+    def get(self, key: str):
+        """Path of the cached file for `key`, or None."""
+        path = self.path(key)
+        with self._lock:
+            self._load_locked()
+            entry = self._index.get(key)
+            if entry is not None and not os.path.exists(path):
+                del self._index[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[1] = time.time()
+        return path
+
+    def commit(self, key: str) -> str:
+        """Account for a file just written at `path(key)` and evict beyond the budget."""
+        path = self.path(key)
+        with self._lock:
+            self._load_locked()
+            self._index[key] = [os.path.getsize(path), time.time()]
+            total = sum(size for size, _ in self._index.values())
+            for old in sorted(self._index, key=lambda k: self._index[k][1]):
+                if total <= self.max_bytes or old == key:
+                    break
+                total -= self._index.pop(old)[0]
+                try:
+                    os.remove(self.path(old))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load_locked()
+            return {
+                "entries": len(self._index),
+                "bytes": sum(size for size, _ in self._index.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -19,6 +19,12 @@ OFFLINE_LAMBDA = 5.0       # Default spectral division bias (Tikhonov)
 AUTO_LAMBDA_FACTOR = 0.01  # Scaling factor for auto-tuned lambda
 NOTCH_THRESHOLD = 0.2      # Fraction of peak to consider for notching
 NUM_NOTCH_PASSES = 2       # How many passes of notch filtering
+NOTCH_WELCH_NPERSEG = 8192  # Welch segment length for notch peak picking (~5 Hz at 44.1 kHz)
+NOTCH_CACHE_SIZE = 1024     # Cached notch designs keyed by (fs, center, bandwidth)
+
+# === Spectral Gating ===
+GATING_NOISE_FRAMES = 128  # Frames in the streaming noise-floor window
+GATING_NOISE_UPDATE = 8    # Streaming noise floor re-estimated every N frames
 
 # === MMSE Parameters ===
 DEFAULT_NOISE_FLOOR = 1e-4  # Relative noise level used in MMSE filter
@@ -27,10 +33,86 @@ DEFAULT_NOISE_FLOOR = 1e-4  # Relative noise level used in MMSE filter
 LIVE_FRAME_SIZE = 1024
 LIVE_INV_LAMBDA = 1e-3      # Default Tikhonov lambda for FIR inversion
 LIVE_GAIN = 4.0             # Output gain multiplier
+LIVE_CONVOLVER = "partitioned"  # "partitioned" (FFT, per-block) or "lfilter" (direct form)
+LIVE_CROSSFADE_BLOCKS = 4   # Blocks over which a hot-swapped filter is crossfaded in
+LIVE_SPECTRAL_GATING = False  # Streaming spectral gate after the inverse filter (+256 samples latency)
+LIVE_GATING_PASSES = 1
 
 # In Backend/config.py
 REG_LAMBDA = 0.01
 
+# === Resampling ===
+RESAMPLE_HALF_TAPS = 10           # Low-pass half-length per max(up, down), as in resample_poly
+RESAMPLE_KAISER_BETA = 5.0
+RESAMPLE_MAX_TERM = 4096          # Larger up/down terms are approximated (limits filter bank size)
+RESAMPLE_CHUNK = 65536            # Input samples resampled per step
+RESAMPLE_DESIGN_CACHE_SIZE = 16   # Polyphase filter banks kept in memory (LRU)
+
+# === Inverse FIR Design ===
+INV_FIR_METHOD = "direct"   # "direct" (dense solve), "levinson" or "frequency"
+LIVE_INV_LENGTH = IMPULSE_LENGTH  # Inverse FIR taps for the live path
+INV_FIR_CG_TOL = 1e-10      # Relative residual for the frequency-domain CG solver
+INV_FIR_CG_MAXITER = 500
+
+# === Inverse FIR Cache ===
+INV_FIR_CACHE_SIZE = 16     # Inverse filters kept in memory (LRU)
+
+# === Sweep Cache ===
+SWEEP_CACHE_SIZE = 8          # Sweeps and inverse-sweep spectra kept in memory (LRU)
+
+# === IR Store ===
+IR_STORE_CACHE_SIZE = 64      # IR arrays/spectra kept in memory (LRU)
+IR_SPECTRUM_CACHE_BYTES = 256 << 20   # Memory for cached IR spectra per process (not written to disk)
+
+# === Batch Deconvolution ===
+BATCH_MAX_ROWS = 16           # Same-size signals transformed together as one 2-D FFT
+BATCH_POLL_SECONDS = 0.1      # How often a batch response checks the job for newly saved files
+
+# === Streaming Deconvolution ===
+STREAM_BLOCK_SIZE = 65536     # Samples read/written per block in streaming mode
+STREAM_INVERSE_TAPS = 32768   # Starting two-sided inverse kernel length (half causal, half anti-causal)
+STREAM_INVERSE_MAX_TAPS = 1 << 20   # Longest inverse kernel before streaming refuses the IR
+STREAM_INVERSE_TOLERANCE = 1e-4     # Max RMS of the inverse left outside the kernel, relative to the whole
+
+# === Job Queue ===
+JOB_WORKERS = os.cpu_count() or 1   # Processes in the deconvolution pool
+JOB_QUEUE_LIMIT = 32                # Max queued + running jobs before HTTP 429
+JOB_HISTORY = 200                   # Finished jobs kept for status/result lookups
+
+# === FFT Engine ===
+FFT_BACKEND = os.environ.get("NOISECLEANSE_FFT_BACKEND", "scipy")   # "scipy" or "numpy"
+FFT_WORKERS = int(os.environ.get("NOISECLEANSE_FFT_WORKERS", os.cpu_count() or 1))
+FFT_PARALLEL_MIN_SIZE = 1 << 16   # Smaller (or single 1-D) transforms run on one thread, e.g. live blocks
+
+# === Spectrogram Pyramid ===
+SPEC_NFFT = 1024              # Finest-level STFT size (bins 0 .. nfft/2 - 1 are kept)
+SPEC_HOP = 256
+SPEC_TILE = 256               # Tile edge in frames and bins; levels halve until one tile spans the signal
+SPEC_MIN_BINS = 64            # Coarser levels stop halving the frequency axis here
+SPEC_TILE_CACHE_SIZE = 256    # dB tiles kept in memory (LRU)
+SPEC_OPEN_LEVELS = 64         # Memory-mapped level arrays kept open (LRU)
+SPECTROGRAM_DIR_MAX_BYTES = 2 << 30   # Stored pyramids beyond this are deleted, least recently used first
+SPEC_DEFAULT_WIDTH = 1024     # Frames wanted across a query when no level is given
+SPEC_MAX_CELLS = 4_000_000    # Largest frames x bins answer for one query
+
+# === Metrics ===
+METRICS_TIMING_HEADERS = True   # Add a Server-Timing header with per-stage timings to API responses
+
+# === Audio I/O ===
+AUDIO_CHUNK = 1 << 18         # Frames per chunk for peak scans, chunked reads and writes
+AUDIO_PEAK_CACHE_SIZE = 256   # File peaks remembered by (path, size, mtime)
+OUTPUT_SUBTYPE = "FLOAT"      # soundfile subtype of recovered WAVs (float32; encoded per request on delivery)
+
+# === Result Cache ===
+RESULT_CACHE_MEMORY_BYTES = 256 << 20   # Recently served result arrays kept in memory (LRU by bytes)
+RESULT_CACHE_MEMORY_ENTRIES = 64
+RESULT_CACHE_DISK_BYTES = int(os.environ.get("NOISECLEANSE_RESULT_CACHE_BYTES", 4 << 30))   # Result WAVs on disk
+
+# === Precision ===
+# "double": float64/complex128 transforms. "single": float32/complex64 end to end
+# (audio I/O, deconvolution, gating, filters, live path) at half the memory traffic.
+PRECISION = os.environ.get("NOISECLEANSE_PRECISION", "double")
+
 # === Paths ===
 OUTPUT_DIR = os.path.join(os.getcwd(), 'output')
 SWEEP_FILE = os.path.join(OUTPUT_DIR, 'sine_sweep.wav')
@@ -38,9 +120,37 @@ RESPONSE_FILE = os.path.join(OUTPUT_DIR, 'room_recorded.wav')
 IR_FILE = os.path.join(OUTPUT_DIR, 'impulse_response.wav')
 SPEECH_FILE = os.path.join(OUTPUT_DIR, 'speech_recorded.wav')
 RECOVERED_FILE = os.path.join(OUTPUT_DIR, 'recovered_output.wav')
+INV_FIR_CACHE_DIR = os.path.join(OUTPUT_DIR, 'inverse_fir_cache')  # None disables the disk tier
+IR_STORE_DIR = os.path.join(OUTPUT_DIR, 'ir_store')
+SWEEP_CACHE_DIR = os.path.join(OUTPUT_DIR, 'sweep_cache')   # None disables the disk tier
+SPECTROGRAM_DIR = os.path.join(OUTPUT_DIR, 'spectrograms')
+RESULTS_DIR = os.path.join(OUTPUT_DIR, 'results')          # Recovered audio, named by result key
 
 # === Plotting ===
 PLOT_DPI = 100
+PLOT_WELCH_NPERSEG = 4096     # Spectrum resolution: fs / nperseg Hz per point
+PLOT_WELCH_MAX_SEGMENTS = 256 # Segments averaged for long signals (evenly spaced)
+PLOT_DATA_MAX_WIDTH = 8192    # Upper bound on bins requested from /api/plot/offline/data
+
+# === Server ===
+HEADLESS = os.environ.get("NOISECLEANSE_HEADLESS", "").lower() in ("1", "true", "yes")  # No audio devices
+UPLOAD_DIR = 'temp_uploads'   # Relative to the working directory, as served by the API
+PLOT_DIR = 'temp_plots'
+UPLOAD_MAX_BYTES = int(os.environ.get("NOISECLEANSE_UPLOAD_MAX_BYTES", 2 << 30))   # Request body cap (HTTP 413)
+
+# === Storage ===
+STORAGE_SWEEP_INTERVAL = 60   # Seconds between background sweeps of the scratch directories
+UPLOAD_DIR_MAX_BYTES = int(os.environ.get("NOISECLEANSE_UPLOAD_DIR_BYTES", 4 << 30))
+UPLOAD_MAX_AGE = 6 * 3600     # Seconds an unused upload is kept for reuse
+OUTPUT_SCRATCH_MAX_BYTES = 2 << 30   # Batch outputs and partial results left under OUTPUT_DIR
+OUTPUT_SCRATCH_MAX_AGE = 24 * 3600
+CACHE_DIR_MAX_BYTES = 1 << 30        # Sweep and inverse FIR .npy caches; recomputed when deleted
+CACHE_MAX_AGE = 7 * 24 * 3600
+PLOT_DIR_MAX_BYTES = 256 << 20
+PLOT_MAX_AGE = 3600
+
 
-# Create output directory if it doesn't exist
-os.makedirs(OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
+def ensure_dirs():
+    """Create the output, upload and plot directories (called at startup, not on import)."""
+    for path in (OUTPUT_DIR, UPLOAD_DIR, PLOT_DIR):
+        os.makedirs(path, exist_ok=True)
@@ -0,0 +1,105 @@
+# noise_cleanse/convolver.py
+
+"""
+Uniformly partitioned overlap-save FIR convolution for block-based streaming.
+
+The filter is split into block-sized partitions whose spectra are computed
+once; each incoming block costs one forward and one inverse FFT of size
+2 * block plus a multiply-accumulate over a frequency-domain delay line.
+"""
+
+import numpy as np
+
+from . import fft_engine
+
+
+def partition_spectra(fir: np.ndarray, block_size: int) -> np.ndarray:
+    """Spectra of `fir` split into block_size partitions, shape (P, block_size + 1)."""
+    fir = np.asarray(fir, dtype=fft_engine.real_dtype()).flatten()
+    n_parts = max(1, -(-len(fir) // block_size))
+    parts = np.zeros((n_parts, block_size), dtype=fir.dtype)
+    parts.flat[:len(fir)] = fir
+    return fft_engine.rfft(parts, n=2 * block_size, axis=-1)
+
+
+class PartitionedConvolver:
+    """Streaming FIR filter equivalent to lfilter(fir, [1.0], x) run block by block."""
+
+    def __init__(self, fir: np.ndarray, block_size: int, spectra: np.ndarray = None):
+        self.block_size = block_size
+        self.spectra = partition_spectra(fir, block_size) if spectra is None else spectra
+        n_parts, n_bins = self.spectra.shape
+        ctype = self.spectra.dtype
+
+        # Preallocated state, reused in place on every block
+        self._input = np.zeros(2 * block_size, dtype=np.finfo(ctype).dtype)
+        self._fdl = np.zeros((n_parts, n_bins), dtype=ctype)
+        self._acc = np.zeros(n_bins, dtype=ctype)
+        self._tmp = np.zeros(n_bins, dtype=ctype)
+        self._pos = 0
+
+    @property
+    def num_partitions(self) -> int:
+        return self.spectra.shape[0]
+
+    def reset(self):
+        """Clear the input history and delay line."""
+        self._input[:] = 0.0
+        self._fdl[:] = 0.0
+        self._pos = 0
+
+    def load_history(self, other):
+        """Copy input history from another convolver so a swapped-in filter starts warm."""
+        if not isinstance(other, PartitionedConvolver) or other.block_size != self.block_size:
+            return
+        self._input[:] = other._input
+        n = min(self.num_partitions, other.num_partitions)
+        order = (other._pos + np.arange(n)) % other.num_partitions
+        self._fdl[:n] = other._fdl[order]
+        self._fdl[n:] = 0.0
+        self._pos = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Filter one block of exactly block_size samples and return the output block."""
+        B = self.block_size
+        if len(block) != B:
+            raise ValueError(f"Expected a block of {B} samples, got {len(block)}.")
+
+        # Sliding input window: previous block followed by the current one
+        self._input[:B] = self._input[B:]
+        self._input[B:] = block
+
+        # The delay line is stored newest-first starting at _pos, so the
+        # products with partitions 0..P-1 are two contiguous slices.
+        P = self.num_partitions
+        self._pos = (self._pos - 1) % P
+        pos = self._pos
+        self._fdl[pos] = fft_engine.rfft(self._input)
+
+        np.einsum('pk,pk->k', self.spectra[:P - pos], self._fdl[pos:], out=self._acc)
+        if pos:
+            np.einsum('pk,pk->k', self.spectra[P - pos:], self._fdl[:pos], out=self._tmp)
+            self._acc += self._tmp
+
+        return fft_engine.irfft(self._acc, n=2 * B)[B:]
+
+
+class DirectFormConvolver:
+    """Streaming FIR filter using lfilter with carried state."""
+
+    def __init__(self, fir: np.ndarray, block_size: int = None):
+        from scipy.signal import lfilter
+
+        self.fir = np.asarray(fir, dtype=fft_engine.real_dtype()).flatten()
+        self._zi = np.zeros(len(self.fir) - 1, dtype=self.fir.dtype)
+        self._lfilter = lfilter
+
+    def reset(self):
+        self._zi[:] = 0.0
+
+    def load_history(self, other):
+        pass
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        y, self._zi = self._lfilter(self.fir, [1.0], block, zi=self._zi)
+        return y
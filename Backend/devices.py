@@ -0,0 +1,68 @@
+# noise_cleanse/devices.py
+
+"""
+Access to the audio device layer.
+
+`sounddevice` (and with it PortAudio) is imported on first use rather than at
+module load, so the offline DSP code and the REST server start on hosts
+without audio hardware. With NOISECLEANSE_HEADLESS set, devices are never
+touched and every device operation raises DeviceUnavailableError.
+"""
+
+import threading
+
+from . import config
+
+
+class DeviceUnavailableError(RuntimeError):
+    """Raised when audio devices are disabled (headless) or cannot be loaded."""
+
+
+_sd = None
+_error = None
+_lock = threading.Lock()
+
+
+def sounddevice():
+    """Return the sounddevice module, importing it on first call."""
+    global _sd, _error
+    if _sd is not None:
+        return _sd
+    if config.HEADLESS:
+        raise DeviceUnavailableError("Audio devices are disabled (headless mode).")
+    with _lock:
+        if _sd is None and _error is None:
+            try:
+                import sounddevice as sd
+                _sd = sd
+            except (ImportError, OSError) as e:
+                _error = f"Audio backend unavailable: {e}"
+    if _sd is None:
+        raise DeviceUnavailableError(_error)
+    return _sd
+
+
+def available() -> bool:
+    try:
+        sounddevice()
+        return True
+    except DeviceUnavailableError:
+        return False
+
+
+def status() -> dict:
+    """Device availability and, when available, the host's devices."""
+    try:
+        sd = sounddevice()
+        devices = [
+            {
+                "index": i,
+                "name": d["name"],
+                "max_input_channels": d["max_input_channels"],
+                "max_output_channels": d["max_output_channels"],
+            }
+            for i, d in enumerate(sd.query_devices())
+        ]
+    except Exception as e:   # headless, no PortAudio, or the host API failed
+        return {"status": "unavailable", "reason": str(e), "devices": []}
+    return {"status": "available", "devices": devices}
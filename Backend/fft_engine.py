@@ -0,0 +1,129 @@
+# noise_cleanse/fft_engine.py
+
+"""
+Shared FFT layer used by the deconvolution and IR extraction code.
+
+Real signals go through rfft/irfft, transform sizes are padded to a fast
+length, and the backend (numpy or scipy) and worker count can be switched
+per deployment via config or set_backend(). The working precision ("double"
+or "single") sets the dtype of every transform and of the arrays the
+processing stages keep; see set_precision().
+"""
+
+import numpy as np
+
+from . import config
+
+BACKENDS = ("scipy", "numpy")
+PRECISIONS = {
+    "double": (np.dtype(np.float64), np.dtype(np.complex128)),
+    "single": (np.dtype(np.float32), np.dtype(np.complex64)),
+}
+
+_sp_fft = None   # scipy.fft, imported on first use
+
+_engine = {
+    "backend": config.FFT_BACKEND,
+    "workers": config.FFT_WORKERS,
+    "precision": config.PRECISION,
+}
+_dtypes = list(PRECISIONS[config.PRECISION])
+
+
+def set_backend(name: str = None, workers: int = None):
+    """Select the FFT backend ("scipy" or "numpy") and/or the worker count."""
+    if name is not None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown FFT backend '{name}', expected one of {BACKENDS}.")
+        _engine["backend"] = name
+    if workers is not None:
+        _engine["workers"] = max(1, int(workers))
+
+
+def get_backend() -> dict:
+    """Return the active backend name, worker count and precision."""
+    return dict(_engine)
+
+
+def set_precision(name: str):
+    """Select "double" (float64/complex128) or "single" (float32/complex64) processing."""
+    if name not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{name}', expected one of {tuple(PRECISIONS)}.")
+    _engine["precision"] = name
+    _dtypes[:] = PRECISIONS[name]
+
+
+def real_dtype() -> np.dtype:
+    """Dtype of real working arrays at the current precision."""
+    return _dtypes[0]
+
+
+def complex_dtype() -> np.dtype:
+    """Dtype of spectra at the current precision."""
+    return _dtypes[1]
+
+
+def _scipy_fft():
+    global _sp_fft
+    if _sp_fft is None:
+        import scipy.fft
+        _sp_fft = scipy.fft
+    return _sp_fft
+
+
+def next_fast_len(n: int, real: bool = True) -> int:
+    """Smallest 5-smooth transform length >= n."""
+    return _scipy_fft().next_fast_len(int(n), real=real)
+
+
+def _real(x) -> np.ndarray:
+    return np.asarray(x, dtype=_dtypes[0])
+
+
+def _complex(X) -> np.ndarray:
+    return np.asarray(X, dtype=_dtypes[1])
+
+
+def _workers(x: np.ndarray, n: int, axis: int) -> int:
+    """
+    Threads for one scipy call. pocketfft splits work across the transforms of
+    a batch, never inside a single 1-D transform, so 1-D inputs and batches
+    below FFT_PARALLEL_MIN_SIZE samples (such as live blocks) use one thread.
+    """
+    workers = _engine["workers"]
+    if workers == 1 or x.ndim < 2 or x.shape[axis] == 0:
+        return 1
+    size = x.size // x.shape[axis] * (n or x.shape[axis])
+    return workers if size >= config.FFT_PARALLEL_MIN_SIZE else 1
+
+
+def rfft(x, n: int = None, axis: int = -1) -> np.ndarray:
+    """Real-input forward FFT."""
+    x = _real(x)
+    if _engine["backend"] == "numpy":
+        return np.fft.rfft(x, n=n, axis=axis).astype(_dtypes[1], copy=False)
+    return _scipy_fft().rfft(x, n=n, axis=axis, workers=_workers(x, n, axis))
+
+
+def irfft(X, n: int = None, axis: int = -1) -> np.ndarray:
+    """Inverse of rfft, returning a real signal of length n."""
+    X = _complex(X)
+    if _engine["backend"] == "numpy":
+        return np.fft.irfft(X, n=n, axis=axis).astype(_dtypes[0], copy=False)
+    return _scipy_fft().irfft(X, n=n, axis=axis, workers=_workers(X, n, axis))
+
+
+def fft(x, n: int = None, axis: int = -1) -> np.ndarray:
+    """Complex forward FFT."""
+    x = _complex(x)
+    if _engine["backend"] == "numpy":
+        return np.fft.fft(x, n=n, axis=axis).astype(_dtypes[1], copy=False)
+    return _scipy_fft().fft(x, n=n, axis=axis, workers=_workers(x, n, axis))
+
+
+def ifft(X, n: int = None, axis: int = -1) -> np.ndarray:
+    """Complex inverse FFT."""
+    X = _complex(X)
+    if _engine["backend"] == "numpy":
+        return np.fft.ifft(X, n=n, axis=axis).astype(_dtypes[1], copy=False)
+    return _scipy_fft().ifft(X, n=n, axis=axis, workers=_workers(X, n, axis))
@@ -1,18 +1,26 @@
 # noise_cleanse/impulse_response.py
 
+import logging
+import os
+
 import numpy as np
-import sounddevice as sd
 import soundfile as sf
-from scipy.signal import butter, filtfilt
-from scipy.fft import fft, ifft
-from scipy.io import wavfile
 
-from . import config
+from . import config, fft_engine, metrics
 from .audio_io import save_audio
+from .cache import ArrayCache, content_key
+from .devices import sounddevice
 
-def generate_sweep(fs: int, duration: float, f1: float, f2: float) -> np.ndarray:
-    """Generate a logarithmic sine sweep and apply fade in/out."""
-    print("Generating sweep...")
+logger = logging.getLogger(__name__)
+
+# Sweeps keyed by (fs, duration, f1, f2), and inverse-sweep spectra keyed by
+# sweep content and FFT size, in memory and on disk
+_sweep_cache = ArrayCache(config.SWEEP_CACHE_SIZE, config.SWEEP_CACHE_DIR)
+_sweep_file_key = {}   # path -> key of the sweep last written there
+
+
+def _make_sweep(fs: int, duration: float, f1: float, f2: float) -> np.ndarray:
+    logger.debug("Generating sweep...")
     t = np.linspace(0, duration, int(fs * duration), endpoint=False)
     sweep = np.sin(2 * np.pi * f1 * (duration / np.log(f2 / f1)) * 
                    (np.exp(t * np.log(f2 / f1) / duration) - 1))
@@ -25,17 +33,64 @@ def generate_sweep(fs: int, duration: float, f1: float, f2: float) -> np.ndarray
     sweep[-fade_len:] *= fade_out
 
     sweep /= np.max(np.abs(sweep) + 1e-9)
-    save_audio(config.SWEEP_FILE, sweep, fs)
     return sweep
 
 
-def extract_ir(recorded: np.ndarray, sweep: np.ndarray, fs: int) -> np.ndarray:
-    """Extract impulse response from recorded response and sweep."""
-    print("Extracting impulse response via deconvolution...")
+@metrics.timed("generate_sweep")
+def generate_sweep(fs: int, duration: float, f1: float, f2: float) -> np.ndarray:
+    """
+    Logarithmic sine sweep with fade in/out, cached by (fs, duration, f1, f2).
+    SWEEP_FILE is only rewritten when it does not already hold this sweep.
+    The returned array is shared and read-only.
+    """
+    key = content_key("sweep", int(fs), float(duration), float(f1), float(f2), config.IR_FADE_SECONDS)
+    sweep = _sweep_cache.get_or_compute(key, lambda: _make_sweep(fs, duration, f1, f2))
+    if _sweep_file_key.get(config.SWEEP_FILE) != key or not os.path.exists(config.SWEEP_FILE):
+        save_audio(config.SWEEP_FILE, sweep, fs)
+        _sweep_file_key[config.SWEEP_FILE] = key
+    return sweep
+
+
+def inverse_sweep(sweep: np.ndarray, f1: float, f2: float) -> np.ndarray:
+    """
+    Farina inverse filter: the time-reversed sweep with a -6 dB/octave envelope
+    compensating the log sweep's 1/f energy distribution, so that
+    sweep * inverse is a band-limited impulse at len(sweep) - 1.
+    """
+    n = len(sweep)
+    envelope = np.exp(-np.arange(n) / n * np.log(f2 / f1))
+    return np.asarray(sweep, dtype=np.float64)[::-1] * envelope
+
+
+def inverse_sweep_spectrum(sweep: np.ndarray, n_fft: int, f1: float = config.FREQ_START,
+                           f2: float = config.FREQ_END) -> np.ndarray:
+    """rfft of the inverse filter at n_fft, scaled for a unit linear-response peak; cached."""
+    key = content_key("inverse_sweep", np.asarray(sweep), float(f1), float(f2), int(n_fft),
+                      str(fft_engine.complex_dtype()))
+
+    def compute():
+        logger.debug("Computing inverse sweep spectrum (n_fft=%d)...", n_fft)
+        inv = fft_engine.rfft(inverse_sweep(sweep, f1, f2), n_fft)
+        peak = np.max(np.abs(fft_engine.irfft(fft_engine.rfft(sweep, n_fft) * inv, n_fft)))
+        return inv / (peak + 1e-12)
+
+    return _sweep_cache.get_or_compute(key, compute)
+
+
+@metrics.timed("extract_ir")
+def extract_ir(recorded: np.ndarray, sweep: np.ndarray, fs: int,
+               f1: float = config.FREQ_START, f2: float = config.FREQ_END) -> np.ndarray:
+    """
+    Extract impulse response from recorded response and sweep by convolving
+    with the (cached) inverse-sweep spectrum; f1/f2 are the sweep's band edges.
+    Harmonic distortion products land before the linear peak and are trimmed.
+    """
+    logger.debug("Extracting impulse response via deconvolution...")
     N = len(recorded) + len(sweep) - 1
-    R = fft(recorded, N)
-    S = fft(sweep, N)
-    IR = np.real(ifft(R / (S + 1e-9)))
+    n_fft = fft_engine.next_fast_len(N)
+    R = fft_engine.rfft(recorded, n_fft)
+    R *= inverse_sweep_spectrum(sweep, n_fft, f1, f2)
+    IR = fft_engine.irfft(R, n_fft)[:N]
 
     # Trim after peak
     peak_idx = np.argmax(np.abs(IR))
@@ -53,9 +108,12 @@ def extract_ir(recorded: np.ndarray, sweep: np.ndarray, fs: int) -> np.ndarray:
     return ir
 
 
+@metrics.timed("preprocess_ir")
 def preprocess_ir(ir: np.ndarray, fs: int, target_len: int = config.IMPULSE_LENGTH) -> np.ndarray:
     """Clean and trim IR: remove DC, HPF, trim tail, pad/cut, normalize."""
-    print("Preprocessing impulse response...")
+    from scipy.signal import butter, filtfilt
+
+    logger.debug("Preprocessing impulse response...")
 
     # Remove DC offset
     ir = ir - np.mean(ir)
@@ -81,12 +139,14 @@ def preprocess_ir(ir: np.ndarray, fs: int, target_len: int = config.IMPULSE_LENG
     # Normalize
     ir = ir / (np.max(np.abs(ir)) + 1e-9)
 
-    return ir
+    return ir.astype(fft_engine.real_dtype(), copy=False)
 
+@metrics.timed("run_full_ir")
 def run_full_ir(duration=config.SWEEP_DURATION, fs=config.FS, output_path=config.IR_FILE):
     """Play sine sweep and record it to generate impulse response."""
-    print("▶ Playing sweep and recording response...")
+    logger.info("Playing sweep and recording response...")
 
+    sd = sounddevice()
     sweep = generate_sweep(fs, duration, config.FREQ_START, config.FREQ_END)
     recording = sd.playrec(sweep, samplerate=fs, channels=1, dtype='float32')
     sd.wait()
@@ -94,6 +154,6 @@ def run_full_ir(duration=config.SWEEP_DURATION, fs=config.FS, output_path=config
     recorded = recording.flatten()
     ir = extract_ir(recorded, sweep, fs)
 
-    print("✅ IR recorded and extracted.")
+    logger.info("IR recorded and extracted.")
     sf.write(output_path, ir, fs)
     return output_path
\ No newline at end of file
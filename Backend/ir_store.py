@@ -0,0 +1,130 @@
+# noise_cleanse/ir_store.py
+
+"""
+Content-addressed store of impulse responses.
+
+Each IR is keyed by a hash of its samples and sample rate and kept on disk
+with its `preprocess_ir` output, so a known IR is never re-uploaded or
+re-filtered. FFT spectra are cached in memory only, under a byte budget.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from . import config, fft_engine
+from .cache import ArrayCache, content_key
+from .impulse_response import preprocess_ir
+
+logger = logging.getLogger(__name__)
+
+_ID_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+_lock = threading.Lock()
+_arrays = ArrayCache(config.IR_STORE_CACHE_SIZE)
+_spectra = ArrayCache(config.IR_STORE_CACHE_SIZE, max_bytes=config.IR_SPECTRUM_CACHE_BYTES)
+
+
+def _ir_dir(ir_id: str) -> str:
+    if not _ID_PATTERN.fullmatch(ir_id or ""):
+        raise KeyError(f"Unknown IR '{ir_id}'.")
+    return os.path.join(config.IR_STORE_DIR, ir_id)
+
+
+def _load_array(ir_id: str, name: str) -> np.ndarray:
+    key = f"{ir_id}/{name}"
+    value = _arrays.get(key)
+    if value is None:
+        path = os.path.join(_ir_dir(ir_id), f"{name}.npy")
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown IR '{ir_id}'.")
+        value = _arrays.put(key, np.load(path), copy=False)
+    return value
+
+
+def _save_array(ir_id: str, name: str, value: np.ndarray) -> np.ndarray:
+    path = os.path.join(_ir_dir(ir_id), f"{name}.npy")
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=_ir_dir(ir_id))   # unique across pool workers
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, value)
+    os.replace(tmp, path)
+    return _arrays.put(f"{ir_id}/{name}", value)
+
+
+def register(data: np.ndarray, fs: int, name: str = None) -> dict:
+    """Add an IR to the store (preprocessing it once) and return its metadata."""
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim > 1:
+        data = data[:, 0]
+    ir_id = content_key(data, int(fs))
+
+    with _lock:
+        try:
+            return get_meta(ir_id)
+        except KeyError:
+            pass
+
+        logger.info("Registering IR %s...", ir_id[:8])
+        os.makedirs(_ir_dir(ir_id), exist_ok=True)
+        _save_array(ir_id, "raw", data)
+        _save_array(ir_id, "preprocessed", preprocess_ir(data, fs))
+        meta = {
+            "ir_id": ir_id,
+            "name": name,
+            "fs": int(fs),
+            "length": len(data),
+            "created": time.time(),
+        }
+        with open(os.path.join(_ir_dir(ir_id), "meta.json"), "w") as f:
+            json.dump(meta, f)
+    return meta
+
+
+def get_meta(ir_id: str) -> dict:
+    path = os.path.join(_ir_dir(ir_id), "meta.json")
+    if not os.path.exists(path):
+        raise KeyError(f"Unknown IR '{ir_id}'.")
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_raw(ir_id: str) -> np.ndarray:
+    return _load_array(ir_id, "raw")
+
+
+def load_preprocessed(ir_id: str) -> np.ndarray:
+    return _load_array(ir_id, "preprocessed")
+
+
+def spectrum(ir_id: str, n_fft: int) -> np.ndarray:
+    """
+    rfft of the preprocessed IR (as float32, like offline_deconvolve) at n_fft.
+    Kept in memory only: recomputing it is cheaper than writing a signal-length
+    spectrum to disk. Spectra larger than the cache budget are not kept.
+    """
+    key = f"{ir_id}/spectrum_{int(n_fft)}_{fft_engine.complex_dtype().name}"
+    value = _spectra.get(key)
+    if value is None:
+        ir = np.nan_to_num(load_preprocessed(ir_id)).astype(np.float32)
+        value = fft_engine.rfft(ir, n=int(n_fft))
+        if value.nbytes <= config.IR_SPECTRUM_CACHE_BYTES:
+            value = _spectra.put(key, value, copy=False)
+    return value
+
+
+def list_irs() -> list:
+    if not os.path.isdir(config.IR_STORE_DIR):
+        return []
+    metas = []
+    for ir_id in sorted(os.listdir(config.IR_STORE_DIR)):
+        try:
+            metas.append(get_meta(ir_id))
+        except KeyError:
+            continue
+    return sorted(metas, key=lambda m: m["created"])
@@ -0,0 +1,241 @@
+# noise_cleanse/jobs.py
+
+"""
+Bounded process-pool job queue for offline deconvolution.
+
+Jobs run in worker processes so long files never block the REST event loop.
+The number of queued + running jobs is capped; submissions beyond the cap
+raise QueueFullError so the API can apply backpressure.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+
+import numpy as np
+import soundfile as sf
+
+from . import config, fft_engine, impulse_response, metrics, offline_deconvolution, storage
+from .audio_io import AudioSource
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at JOB_QUEUE_LIMIT."""
+
+
+def scratch_path(output_path, job_id: str) -> str:
+    """Temporary name job `job_id` writes `output_path` under before renaming it into place."""
+    return f"{output_path}.{job_id}.tmp.wav"
+
+
+def deconvolve_job(signal_path, output_path, gain: float = 1.0, ir_path=None,
+                   ir_pre=None, stream: bool = False, ir_spectrum=None, tmp_path=None,
+                   signal=None, fs: int = config.FS) -> dict:
+    """
+    Worker entry point: load inputs, deconvolve and save the recovered audio.
+    `signal` (samples at `fs`) replaces `signal_path` for uploads kept in memory.
+    The output is written to `tmp_path` and renamed into place, so
+    `output_path` only ever holds a complete result.
+    The worker's stage timings are returned under "metrics" for the parent to merge.
+    """
+    if ir_pre is None:
+        ir_data, _ = sf.read(ir_path)
+        ir_pre = impulse_response.preprocess_ir(ir_data, config.FS)
+
+    tmp_path = tmp_path or f"{output_path}.{os.getpid()}.tmp.wav"
+    try:
+        if stream:
+            source = signal_path if signal is None else AudioSource.from_array(signal, fs)
+            offline_deconvolution.offline_deconvolve_file(source, ir_pre, tmp_path, gain=gain)
+        else:
+            if signal is None:
+                signal, _ = sf.read(signal_path, dtype=fft_engine.real_dtype().name)
+            recovered = offline_deconvolution.offline_deconvolve(
+                np.asarray(signal, dtype=fft_engine.real_dtype()), ir_pre, config.FS, gain=gain,
+                ir_spectrum=ir_spectrum
+            )
+            offline_deconvolution.save_output_audio(recovered, config.FS, tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return {"output_path": str(output_path), "metrics": metrics.drain()}
+
+
+def deconvolve_batch_job(signals, output_paths, ir_pre, gain: float = 1.0, ir_spectrum=None,
+                         tmp_paths=None) -> dict:
+    """
+    Worker entry point for a batch: deconvolve every signal (samples, or a WAV
+    path) against one IR and save each result to its output path (via the
+    matching `tmp_paths` entry), renamed into place as soon as it is written
+    so the API can stream progress.
+    """
+    sig_data = [sf.read(s, dtype="float32")[0] if isinstance(s, (str, os.PathLike)) else s for s in signals]
+    for i, recovered in offline_deconvolution.offline_deconvolve_batch(
+        sig_data, ir_pre, config.FS, gain=gain, ir_spectrum=ir_spectrum
+    ):
+        tmp_path = tmp_paths[i] if tmp_paths else f"{output_paths[i]}.{os.getpid()}.tmp.wav"
+        offline_deconvolution.save_output_audio(recovered, config.FS, tmp_path)
+        os.replace(tmp_path, output_paths[i])
+    return {"output_paths": [str(p) for p in output_paths], "metrics": metrics.drain()}
+
+
+_jobs = {}
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Forked workers inherit the parent's stage timings; clear them so a
+            # job's drained snapshot holds only what the job itself recorded
+            _executor = ProcessPoolExecutor(max_workers=config.JOB_WORKERS, initializer=metrics.drain)
+        return _executor
+
+
+def _state(job: dict) -> str:
+    future = job["future"]
+    if future.cancelled() or (future.done() and job["cancel_requested"]):
+        return "cancelled"
+    if future.done():
+        return "failed" if future.exception() is not None else "done"
+    if future.running():
+        return "cancelling" if job["cancel_requested"] else "running"
+    return "cancelling" if job["cancel_requested"] else "queued"
+
+
+def _prune_locked():
+    """Forget the oldest finished jobs beyond JOB_HISTORY, deleting their files."""
+    finished = [j for j in _jobs.values() if j["future"].done()]
+    finished.sort(key=lambda j: j["submitted"])
+    for job in finished[:max(0, len(finished) - config.JOB_HISTORY)]:
+        del _jobs[job["id"]]
+        for path in job["files"]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def queue_depth() -> int:
+    """Number of jobs that are queued or running."""
+    with _lock:
+        return sum(1 for j in _jobs.values() if not j["future"].done())
+
+
+def submit(fn, *args, job_id: str = None, files=(), hold=(), **kwargs) -> str:
+    """
+    Submit `fn(*args, **kwargs)` to the pool and return its job ID (`job_id`,
+    if given, so outputs can be named after it). `files` are deleted when the
+    job drops out of the history. `hold` paths are referenced in `storage` until
+    the job finishes, so the sweeper never deletes files the job is writing.
+    """
+    executor = _get_executor()
+    with _lock:
+        active = sum(1 for j in _jobs.values() if not j["future"].done())
+        if active >= config.JOB_QUEUE_LIMIT:
+            metrics.inc("jobs_rejected_total", help="Job submissions refused because the queue was full.")
+            raise QueueFullError(f"Job queue full ({active}/{config.JOB_QUEUE_LIMIT}).")
+        job_id = job_id or uuid.uuid4().hex
+        if job_id in _jobs:
+            raise ValueError(f"Job '{job_id}' already exists.")
+        job = {
+            "id": job_id,
+            "submitted": time.time(),
+            "finished": None,
+            "cancel_requested": False,
+            "files": list(files),
+        }
+        for path in hold:
+            storage.acquire(path)
+        try:
+            job["future"] = executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            for path in hold:
+                storage.release(path)
+            raise
+        _jobs[job_id] = job
+        _prune_locked()
+
+    def _done(future):
+        for path in hold:
+            storage.release(path)
+        job["finished"] = time.time()
+        metrics.inc("jobs_finished_total", state=_state(job), help="Finished jobs by final state.")
+        if not future.cancelled() and future.exception() is None:
+            out = future.result()
+            if isinstance(out, dict) and "metrics" in out:
+                metrics.merge(out["metrics"])
+
+    job["future"].add_done_callback(_done)
+    return job_id
+
+
+def on_done(job_id: str, callback):
+    """Call `callback()` in the parent process once the job has finished, in any state."""
+    _get(job_id)["future"].add_done_callback(lambda _: callback())
+
+
+def _get(job_id: str) -> dict:
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        raise KeyError(f"Unknown job '{job_id}'.")
+    return job
+
+
+def status(job_id: str) -> dict:
+    """Return the state and timing of a job."""
+    job = _get(job_id)
+    state = _state(job)
+    info = {
+        "job_id": job_id,
+        "status": state,
+        "submitted": job["submitted"],
+        "finished": job["finished"],
+    }
+    if state == "failed":
+        info["error"] = str(job["future"].exception())
+    return info
+
+
+def result(job_id: str):
+    """Return the job's result; raises if it is not finished successfully."""
+    job = _get(job_id)
+    state = _state(job)
+    if state == "cancelled":
+        raise CancelledError(f"Job '{job_id}' was cancelled.")
+    return job["future"].result(timeout=0)
+
+
+def cancel(job_id: str) -> str:
+    """Cancel a job. Queued jobs are dropped; running jobs finish but their result is discarded."""
+    job = _get(job_id)
+    job["cancel_requested"] = True
+    job["future"].cancel()
+    return _state(job)
+
+
+async def wait(job_id: str):
+    """
+    Await a job's completion without blocking the event loop and return its result.
+    A cancelled job raises concurrent.futures.CancelledError, like `result`.
+    """
+    job = _get(job_id)
+    try:
+        await asyncio.wrap_future(job["future"])
+    except asyncio.CancelledError:
+        if not job["future"].cancelled():
+            raise   # the awaiting task itself was cancelled
+    return result(job_id)
+
+
+def list_jobs() -> list:
+    with _lock:
+        ids = list(_jobs)
+    return [status(job_id) for job_id in ids]
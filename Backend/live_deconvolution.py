@@ -1,91 +1,488 @@
 # noise_cleanse/live_deconvolution.py
 
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
 import numpy as np
-import sounddevice as sd
-from scipy.signal import lfilter
-from scipy.linalg import toeplitz
-from scipy.fft import fft, ifft
 
-from . import config
+from . import config, fft_engine, metrics, resampler
+from .cache import ArrayCache, content_key
+from .convolver import PartitionedConvolver, DirectFormConvolver, partition_spectra
+from .devices import sounddevice
+from .spectral_gating import SpectralGate
 from .utils import auto_lambda_from_ir
 
-# Global state for streaming
-_stream = {
-    "input": None,
-    "output": None,
-    "inverse_fir": None,
-    "fir_state": None
-}
+logger = logging.getLogger(__name__)
+
+# Inverse filters keyed by IR content, length and lambda
+_inverse_cache = ArrayCache(config.INV_FIR_CACHE_SIZE, config.INV_FIR_CACHE_DIR)
+
+# Partition spectra keyed by inverse filter content and block size, shared by all sessions
+_spectra_cache = ArrayCache(config.INV_FIR_CACHE_SIZE)
+
+DEFAULT_SESSION = "default"
+
+# sounddevice.CallbackFlags counted per session
+XRUN_FLAGS = ("input_underflow", "input_overflow", "output_underflow", "output_overflow", "priming_output")
+
+
+INVERSE_METHODS = ("direct", "levinson", "frequency")
+
+
+def _autocorrelation(h: np.ndarray, length: int) -> np.ndarray:
+    """First `length` lags of the autocorrelation of `h`, via FFT."""
+    n_fft = fft_engine.next_fast_len(len(h) + length)
+    H = fft_engine.rfft(h, n_fft)
+    r = fft_engine.irfft(np.abs(H)**2, n_fft)[:length]
+    if len(r) < length:
+        r = np.pad(r, (0, length - len(r)))
+    return r
+
+
+def _solve_toeplitz_cg(r: np.ndarray, rhs: np.ndarray, tol: float, maxiter: int) -> np.ndarray:
+    """Solve the symmetric Toeplitz system T(r) g = rhs by preconditioned CG in O(L log L) per step."""
+    L = len(r)
+    n_fft = fft_engine.next_fast_len(2 * L)
+
+    # T(r) embedded in a circulant of size n_fft, for fast matrix-vector products
+    c = np.zeros(n_fft)
+    c[:L] = r
+    c[n_fft - L + 1:] = r[1:][::-1]
+    C = fft_engine.rfft(c)
+
+    def matvec(x):
+        return fft_engine.irfft(C * fft_engine.rfft(x, n_fft), n_fft)[:L]
+
+    # T. Chan circulant preconditioner: the regularized frequency-domain inverse
+    k = np.arange(L)
+    p = ((L - k) * r + k * np.concatenate(([0.0], r[1:][::-1]))) / L
+    P = np.maximum(fft_engine.rfft(p).real, r[0] * 1e-12)
+
+    def precond(x):
+        return fft_engine.irfft(fft_engine.rfft(x) / P, L)
+
+    g = np.zeros(L)
+    res = rhs.copy()
+    z = precond(res)
+    d = z.copy()
+    rz = res @ z
+    stop = tol * np.linalg.norm(rhs)
+    for _ in range(maxiter):
+        Td = matvec(d)
+        alpha = rz / (d @ Td)
+        g += alpha * d
+        res -= alpha * Td
+        if np.linalg.norm(res) <= stop:
+            break
+        z = precond(res)
+        rz_new = res @ z
+        d = z + (rz_new / rz) * d
+        rz = rz_new
+    return g
 
 
-def compute_inverse_fir(ir: np.ndarray, length: int, reg_lambda: float = None) -> np.ndarray:
-    """Compute inverse FIR filter using Tikhonov regularization."""
-    print("Computing inverse FIR filter...")
+@metrics.timed("compute_inverse_fir")
+def compute_inverse_fir(ir: np.ndarray, length: int, reg_lambda: float = None,
+                        method: str = "direct") -> np.ndarray:
+    """
+    Compute inverse FIR filter using Tikhonov regularization.
+
+    `direct` solves the dense normal equations of the truncated convolution
+    matrix (O(L^3)). `levinson` and `frequency` solve the full least-squares
+    system through its Toeplitz autocorrelation matrix, with Levinson-Durbin
+    (O(L^2), O(L) memory) or FFT-preconditioned CG (O(L log L)) respectively.
+
+    The two systems differ: `direct` keeps only the first len(ir) rows of
+    ir * g, so the last length - 1 output samples are not penalised, while the
+    Toeplitz engines fit the whole convolution. They give `direct`'s result
+    for the IR zero-padded by length - 1 samples, not for the IR as given.
+    """
+    from scipy.linalg import toeplitz, solve_toeplitz
+
+    logger.info("Computing inverse FIR filter (%s)...", method)
 
     # Automatically tune lambda if not provided
     if reg_lambda is None:
         reg_lambda = auto_lambda_from_ir(ir)
 
     h = ir.flatten()
-    H = toeplitz(h, np.zeros(length))
-    d = np.zeros(H.shape[0])
-    d[0] = 1  # delta function
+    if method == "direct":
+        H = toeplitz(h, np.zeros(length))
+        d = np.zeros(H.shape[0])
+        d[0] = 1  # delta function
 
-    regularized = H.T @ H + reg_lambda * np.eye(length)
-    g = np.linalg.solve(regularized, H.T @ d)
+        regularized = H.T @ H + reg_lambda * np.eye(length)
+        g = np.linalg.solve(regularized, H.T @ d)
+    elif method in ("levinson", "frequency"):
+        r = _autocorrelation(h, length)
+        r[0] += reg_lambda
+        rhs = np.zeros(length)
+        rhs[0] = h[0]  # H^T applied to the delta function
+        if method == "levinson":
+            g = solve_toeplitz(r, rhs)
+        else:
+            g = _solve_toeplitz_cg(r, rhs, config.INV_FIR_CG_TOL, config.INV_FIR_CG_MAXITER)
+    else:
+        raise ValueError(f"Unknown inverse FIR method '{method}', expected one of {INVERSE_METHODS}.")
 
     # Normalize inverse filter
     g /= (np.sum(g**2) + 1e-9)
     return g
 
 
-def audio_callback(indata, outdata, frames, time, status):
-    """Callback function for real-time deconvolution."""
-    if status:
-        print(f"Stream status: {status}")
+def get_inverse_fir(ir: np.ndarray, length: int, reg_lambda: float = None,
+                    method: str = config.INV_FIR_METHOD) -> np.ndarray:
+    """Return the inverse FIR for `ir`, reusing a cached design when available."""
+    if reg_lambda is None:
+        reg_lambda = auto_lambda_from_ir(ir)
+
+    ir = np.asarray(ir, dtype=np.float64).flatten()
+    key = content_key(ir, length, float(reg_lambda), method)
+    cached = _inverse_cache.get(key)
+    if cached is not None:
+        logger.debug("Using cached inverse FIR filter.")
+        metrics.inc("inverse_fir_cache_total", result="hit", help="Inverse FIR lookups by cache result.")
+        return cached
+    metrics.inc("inverse_fir_cache_total", result="miss", help="Inverse FIR lookups by cache result.")
+    return _inverse_cache.put(key, compute_inverse_fir(ir, length, reg_lambda, method), copy=False)
+
+
+def _make_convolver(inv_fir: np.ndarray):
+    if config.LIVE_CONVOLVER == "partitioned":
+        key = content_key(np.asarray(inv_fir, dtype=np.float64), config.LIVE_FRAME_SIZE,
+                          str(fft_engine.complex_dtype()))
+        spectra = _spectra_cache.get_or_compute(
+            key, lambda: partition_spectra(inv_fir, config.LIVE_FRAME_SIZE)
+        )
+        return PartitionedConvolver(inv_fir, config.LIVE_FRAME_SIZE, spectra=spectra)
+    return DirectFormConvolver(inv_fir)
+
+
+class LiveSession:
+    """
+    One mic → deconvolution → speaker chain.
+
+    `convolver`, `previous` and the fade state belong to the realtime callback
+    while the stream is running; other threads hand it new filters only through
+    the single-slot `pending` queue. `_generation` changes on every start, stop
+    and swap, so a filter designed in the background is dropped if it is stale.
+    """
+
+    def __init__(self, session_id: str, input_device=None, output_device=None,
+                 input_channel: int = 0, output_channel: int = 0, samplerate: int = None):
+        self.session_id = session_id
+        self.input_device = input_device
+        self.output_device = output_device
+        self.input_channel = input_channel
+        self.output_channel = output_channel
+        self.samplerate = samplerate   # Device rate; None runs the stream at the IR's rate
+
+        self.stream = None
+        self.fs = None
+        self.inverse_fir = None
+        self.filter_fs = None   # Rate inverse_fir was designed for; kept across stop for restarts
+        self.convolver = None
+        self.previous = None
+        self.fade_ramp = None
+        self.fade_pos = 0
+        self.pending = deque(maxlen=1)
+        self.gate = None
+
+        # Callback load statistics (processing time / block duration)
+        self._reset_stats()
+
+        # Serializes start/stop/swap requests from the REST and CLI threads
+        self._control_lock = threading.Lock()
+        self._generation = 0
 
-    x = indata[:, 0]
-    y, _stream["fir_state"] = lfilter(
-        _stream["inverse_fir"], [1.0], x, zi=_stream["fir_state"]
-    )
-    y *= config.LIVE_GAIN
-    outdata[:, 0] = y
+    def _reset_stats(self):
+        self.blocks = 0
+        self.cpu_load = 0.0
+        self.cpu_load_peak = 0.0
+        self.callback_seconds = 0.0
+        self.callback_seconds_max = 0.0
+        self.deadline_misses = 0
+        self.xruns = dict.fromkeys(XRUN_FLAGS, 0)
 
+    @property
+    def running(self) -> bool:
+        return self.stream is not None
 
-def start_live_deconv(ir: np.ndarray, fs: int = config.FS):
-    """Start real-time deconvolution with given impulse response."""
-    if _stream["input"] is not None:
-        stop_live_deconv()
+    def _take_pending(self):
+        """Adopt a queued filter at the block boundary and begin the crossfade."""
+        if self.previous is not None:
+            return  # finish the current crossfade first
+        try:
+            new_conv, ramp = self.pending.popleft()
+        except IndexError:
+            return
+        new_conv.load_history(self.convolver)
+        self.previous = self.convolver
+        self.convolver = new_conv
+        self.fade_ramp = ramp
+        self.fade_pos = 0
 
-    print("Starting live deconvolution...")
+    def audio_callback(self, indata, outdata, frames, time_info, status):
+        """Callback function for real-time deconvolution."""
+        start = time.perf_counter()
+        if status:
+            for flag in XRUN_FLAGS:
+                if getattr(status, flag, False):
+                    self.xruns[flag] += 1
 
-    inv_fir = compute_inverse_fir(ir, config.IMPULSE_LENGTH)
-    fir_state = np.zeros(len(inv_fir) - 1)
+        x = indata[:, self.input_channel]
+        self._take_pending()
+        y = self.convolver.process(x)
 
-    _stream["inverse_fir"] = inv_fir
-    _stream["fir_state"] = fir_state
+        if self.previous is not None:
+            # y = y_old + w * (y_new - y_old), in place
+            y_old = self.previous.process(x)
+            pos = self.fade_pos
+            y -= y_old
+            y *= self.fade_ramp[pos:pos + frames]
+            y += y_old
+            pos += frames
+            if pos >= len(self.fade_ramp):
+                self.previous = None
+                self.fade_ramp = None
+            self.fade_pos = pos
 
-    _stream["input"] = sd.Stream(
-        samplerate=fs,
-        blocksize=config.LIVE_FRAME_SIZE,
-        channels=1,
-        dtype='float32',
-        callback=audio_callback
-    )
-    _stream["input"].start()
-    print("Mic → Deconv → Speaker is live.")
+        if self.gate is not None:
+            y = self.gate.process_block(y)
 
+        if outdata.shape[1] > 1:
+            outdata.fill(0.0)
+        np.multiply(y, config.LIVE_GAIN, out=outdata[:, self.output_channel])
 
-def stop_live_deconv():
+        elapsed = time.perf_counter() - start
+        load = elapsed * (self.fs or config.FS) / frames
+        self.callback_seconds += elapsed
+        self.callback_seconds_max = max(self.callback_seconds_max, elapsed)
+        if load > 1.0:
+            self.deadline_misses += 1
+        self.cpu_load = 0.9 * self.cpu_load + 0.1 * load if self.blocks else load
+        self.cpu_load_peak = max(self.cpu_load_peak, load)
+        self.blocks += 1
+
+    def _queue_filter(self, ir: np.ndarray, generation: int):
+        """Design the inverse filter for `ir` and queue it, unless the session changed meanwhile."""
+        inv_fir = get_inverse_fir(ir, config.LIVE_INV_LENGTH)
+        new_conv = _make_convolver(inv_fir)
+        fade_len = max(1, config.LIVE_CROSSFADE_BLOCKS) * config.LIVE_FRAME_SIZE
+        ramp = (np.arange(1, fade_len + 1) / fade_len).astype(fft_engine.real_dtype())
+        with self._control_lock:
+            if not self.running or generation != self._generation:
+                logger.info("[%s] Dropping inverse filter: session stopped or a newer IR was loaded.",
+                            self.session_id)
+                return
+            self.inverse_fir = inv_fir
+            self.pending.append((new_conv, ramp))
+        logger.info("[%s] New inverse filter queued for hot swap.", self.session_id)
+
+    def _swap_locked(self, ir: np.ndarray) -> threading.Thread:
+        self._generation += 1
+        thread = threading.Thread(target=self._queue_filter, args=(ir, self._generation), daemon=True)
+        thread.start()
+        return thread
+
+    def swap_filter(self, ir: np.ndarray) -> threading.Thread:
+        """Swap the running stream's filter for one designed from `ir`, without restarting it."""
+        with self._control_lock:
+            return self._swap_locked(ir)
+
+    def load_filter(self, ir: np.ndarray, fs: int = config.FS):
+        """Design the inverse filter for `ir`, sampled at `fs`, without opening the stream."""
+        with self._control_lock:
+            ir, fs = self._at_stream_rate(ir, fs)
+            if self.running:
+                if self.fs != fs:
+                    raise ValueError(f"Session '{self.session_id}' runs at {self.fs} Hz, not {fs} Hz.")
+                self._swap_locked(ir)
+                return
+            self._generation += 1
+            self.inverse_fir = get_inverse_fir(ir, config.LIVE_INV_LENGTH)
+            self.filter_fs = fs
+
+    def _at_stream_rate(self, ir: np.ndarray, fs: int):
+        """Resample `ir` to the session's device rate, if one is set and differs."""
+        if ir is None or not self.samplerate or self.samplerate == fs:
+            return ir, self.samplerate or fs
+        logger.info("[%s] Resampling IR %d -> %d Hz.", self.session_id, fs, self.samplerate)
+        return resampler.resample(ir, fs, self.samplerate), self.samplerate
+
+    def start(self, ir: np.ndarray = None, fs: int = None):
+        """
+        Start the stream, or hot-swap the filter if it is already running.
+        `fs` is the rate of `ir` (config.FS if not given); without a new IR the
+        stream opens at the rate the loaded filter was designed for.
+        """
+        with self._control_lock:
+            if ir is None:
+                fs = self.filter_fs or fs or config.FS
+            else:
+                ir, fs = self._at_stream_rate(ir, fs or config.FS)
+            if self.running:
+                if ir is None:
+                    return
+                if self.fs == fs:
+                    logger.info("[%s] Live deconvolution running, swapping filter...", self.session_id)
+                    self._swap_locked(ir)
+                    return
+                self._stop_locked()
+
+            self._generation += 1
+
+            if ir is not None:
+                self.inverse_fir = get_inverse_fir(ir, config.LIVE_INV_LENGTH)
+                self.filter_fs = fs
+            if self.inverse_fir is None:
+                raise ValueError(f"Session '{self.session_id}' has no IR loaded.")
+
+            sd = sounddevice()
+            logger.info("[%s] Starting live deconvolution...", self.session_id)
+            self.convolver = _make_convolver(self.inverse_fir)
+            self.previous = None
+            self.fade_ramp = None
+            self.fade_pos = 0
+            self.pending.clear()
+            self.fs = fs
+            self.gate = SpectralGate(fs, config.LIVE_GATING_PASSES) if config.LIVE_SPECTRAL_GATING else None
+            self._reset_stats()
+
+            self.stream = sd.Stream(
+                samplerate=fs,
+                blocksize=config.LIVE_FRAME_SIZE,
+                device=(self.input_device, self.output_device),
+                channels=(self.input_channel + 1, self.output_channel + 1),
+                dtype='float32',
+                callback=self.audio_callback
+            )
+            self.stream.start()
+            logger.info("[%s] Mic → Deconv → Speaker is live.", self.session_id)
+
+    def _stop_locked(self):
+        self._generation += 1
+        if self.stream is not None:
+            logger.info("[%s] Stopping live deconvolution...", self.session_id)
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+            self.fs = None
+            self.convolver = None
+            self.previous = None
+            self.fade_ramp = None
+            self.gate = None
+            self.pending.clear()
+            logger.info("[%s] Live deconvolution stopped.", self.session_id)
+        else:
+            logger.info("No live stream to stop for session '%s'.", self.session_id)
+
+    def stop(self):
+        """Stop the stream, keeping the loaded filter."""
+        with self._control_lock:
+            self._stop_locked()
+
+    def status(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "running": self.running,
+            "ir_loaded": self.inverse_fir is not None,
+            "fs": self.fs,
+            "samplerate": self.samplerate,
+            "input_device": self.input_device,
+            "output_device": self.output_device,
+            "input_channel": self.input_channel,
+            "output_channel": self.output_channel,
+            "blocks": self.blocks,
+            "cpu_load": round(self.cpu_load, 4),
+            "cpu_load_peak": round(self.cpu_load_peak, 4),
+            "deadline_misses": self.deadline_misses,
+            "xruns": dict(self.xruns),
+        }
+
+
+# Session registry
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(session_id: str = None, input_device=None, output_device=None,
+                   input_channel: int = 0, output_channel: int = 0, samplerate: int = None) -> LiveSession:
+    """Create a live session; raises ValueError if the ID is already taken."""
+    session_id = session_id or uuid.uuid4().hex[:8]
+    with _sessions_lock:
+        if session_id in _sessions:
+            raise ValueError(f"Session '{session_id}' already exists.")
+        session = LiveSession(session_id, input_device, output_device, input_channel, output_channel, samplerate)
+        _sessions[session_id] = session
+    return session
+
+
+def get_session(session_id: str = DEFAULT_SESSION, create: bool = False) -> LiveSession:
+    """Look up a session; the default session is created on demand when `create` is set."""
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session is None and create:
+            session = _sessions[session_id] = LiveSession(session_id)
+    if session is None:
+        raise KeyError(f"Unknown live session '{session_id}'.")
+    return session
+
+
+def remove_session(session_id: str):
+    """Stop a session and drop it from the registry."""
+    with _sessions_lock:
+        session = _sessions.pop(session_id, None)
+    if session is None:
+        raise KeyError(f"Unknown live session '{session_id}'.")
+    session.stop()
+
+
+def list_sessions() -> list:
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    return [s.status() for s in sessions]
+
+
+def audio_callback(indata, outdata, frames, time_info, status):
+    """Callback function for real-time deconvolution on the default session."""
+    get_session(DEFAULT_SESSION).audio_callback(indata, outdata, frames, time_info, status)
+
+
+def start_live_deconv(ir: np.ndarray, fs: int = config.FS, session_id: str = DEFAULT_SESSION):
+    """Start real-time deconvolution, or hot-swap the filter if the session is already running."""
+    get_session(session_id, create=True).start(ir, fs)
+
+
+def stop_live_deconv(session_id: str = DEFAULT_SESSION):
     """Stop the real-time deconvolution stream."""
-    if _stream["input"] is not None:
-        print("Stopping live deconvolution...")
-        _stream["input"].stop()
-        _stream["input"].close()
-        _stream["input"] = None
-        _stream["fir_state"] = None
-        _stream["inverse_fir"] = None
-        print("Live deconvolution stopped.")
-    else:
-        print("ℹNo live stream to stop.")
+    try:
+        get_session(session_id).stop()
+    except KeyError:
+        logger.info("No live stream to stop.")
+
+
 
+@metrics.register_collector
+def _collect_live_metrics():
+    """Per-session callback statistics for the metrics endpoint."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    blocks, seconds, peak, misses, xruns = [], [], [], [], []
+    for s in sessions:
+        labels = {"session": s.session_id}
+        blocks.append((labels, s.blocks))
+        seconds.append((labels, round(s.callback_seconds, 6)))
+        peak.append((labels, round(s.callback_seconds_max, 6)))
+        misses.append((labels, s.deadline_misses))
+        xruns.extend(({"session": s.session_id, "flag": flag}, n) for flag, n in s.xruns.items())
+    return [
+        ("live_blocks_total", "counter", "Audio blocks processed by the live callback.", blocks),
+        ("live_callback_seconds_total", "counter", "Time spent inside the live callback.", seconds),
+        ("live_callback_seconds_max", "gauge", "Longest single live callback.", peak),
+        ("live_deadline_misses_total", "counter", "Callbacks that took longer than their block duration.", misses),
+        ("live_xruns_total", "counter", "Stream status flags reported by the audio driver.", xruns),
+    ]
@@ -1,5 +1,6 @@
 # noise_cleanse/main.py
 
+import logging
 import time
 from Backend import (
     config,
@@ -94,6 +95,8 @@ def option_4_plot_signals():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    config.ensure_dirs()
     print("NoiseCleanse CLI Application")
 
     while True:
@@ -0,0 +1,190 @@
+# noise_cleanse/metrics.py
+
+"""
+Lightweight instrumentation: per-stage timers, counters and a Prometheus
+text exposition.
+
+    with metrics.stage("offline_deconvolve"):
+        ...
+
+    @metrics.timed("extract_ir")
+    def extract_ir(...): ...
+
+Stages timed inside a request are also collected per request, so the REST
+layer can return them as a Server-Timing header. Worker processes hand their
+timings back with `drain()` / `merge()`.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+
+_lock = threading.Lock()
+_stages = {}     # stage -> [count, total seconds, max seconds]
+_counters = {}   # (name, sorted label items) -> value
+_help = {}
+_collectors = []
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+PREFIX = "noisecleanse"
+
+
+def observe(name: str, seconds: float):
+    """Record one execution of stage `name`."""
+    with _lock:
+        entry = _stages.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class stage:
+    """Context manager / decorator timing a processing stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(self.name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+timed = stage
+
+
+def inc(name: str, value: float = 1, help: str = None, **labels):
+    """Increment counter `name` (with optional labels)."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        if help:
+            _help[name] = help
+
+
+def register_collector(fn):
+    """
+    Register a callable returning metrics gathered at scrape time, as
+    (name, type, help, [(labels dict, value), ...]) tuples.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def drain() -> dict:
+    """Return and clear this process's stage timings (used by pool workers)."""
+    with _lock:
+        snapshot = {name: list(entry) for name, entry in _stages.items()}
+        _stages.clear()
+    return snapshot
+
+
+def merge(snapshot: dict):
+    """Fold stage timings drained from another process into this one."""
+    with _lock:
+        for name, (count, total, peak) in snapshot.items():
+            entry = _stages.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], peak)
+
+
+# ---------------------------------------------------------------------------
+#  Per-request timings
+# ---------------------------------------------------------------------------
+def begin_request():
+    return _request_timings.set([])
+
+
+def end_request(token) -> list:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def add_request_timings(snapshot: dict):
+    """Attribute stage totals from a drained snapshot to the current request."""
+    timings = _request_timings.get()
+    if timings is not None:
+        for name, (_, total, _) in snapshot.items():
+            timings.append((name, total))
+
+
+def server_timing(timings: list, total: float) -> str:
+    """Format stage timings as a Server-Timing header value (milliseconds)."""
+    merged = {}
+    for name, seconds in timings:
+        merged[name] = merged.get(name, 0.0) + seconds
+    parts = [f"{name};dur={1e3 * seconds:.2f}" for name, seconds in merged.items()]
+    parts.append(f"total;dur={1e3 * total:.2f}")
+    return ", ".join(parts)
+
+
+# ---------------------------------------------------------------------------
+#  Exposition
+# ---------------------------------------------------------------------------
+def _escape(value) -> str:
+    """Label value escaped as the text format requires: backslash, double quote and newline."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(items) -> str:
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        stages = {name: list(entry) for name, entry in _stages.items()}
+        counters = dict(_counters)
+        helps = dict(_help)
+
+    if stages:
+        name = f"{PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Time spent in processing stages.")
+        lines.append(f"# TYPE {name} summary")
+        for stage_name, (count, total, _) in sorted(stages.items()):
+            lines.append(f'{name}_count{{stage="{stage_name}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage_name}"}} {total:.6f}')
+        lines.append(f"# HELP {name}_max Longest single execution of each stage.")
+        lines.append(f"# TYPE {name}_max gauge")
+        for stage_name, (_, _, peak) in sorted(stages.items()):
+            lines.append(f'{name}_max{{stage="{stage_name}"}} {peak:.6f}')
+
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name, samples in sorted(by_name.items()):
+        full = f"{PREFIX}_{name}"
+        lines.append(f"# HELP {full} {helps.get(name, name)}")
+        lines.append(f"# TYPE {full} counter")
+        for labels, value in samples:
+            lines.append(f"{full}{_labels(labels)} {value}")
+
+    for collector in list(_collectors):
+        for name, kind, help_text, samples in collector():
+            full = f"{PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for labels, value in samples:
+                lines.append(f"{full}{_labels(sorted(labels.items()))} {value}")
+
+    return "\n".join(lines) + "\n"
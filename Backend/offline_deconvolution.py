@@ -1,20 +1,24 @@
 # noise_cleanse/offline_deconvolution.py
 
+import logging
+from functools import lru_cache
+
 import numpy as np
-from scipy.signal import butter, filtfilt, spectrogram, istft, find_peaks
-from scipy.fft import fft, ifft
 
-from . import config
-from .audio_io import save_audio
+from . import config, fft_engine, metrics, spectral_gating
+from .audio_io import AudioSource, AudioWriter, save_audio
 from .utils import normalize as util_normalize
-import soundfile as sf
 import os
 
+logger = logging.getLogger(__name__)
+
+@metrics.timed("spectral_division")
 def spectral_division(recorded: np.ndarray, ir: np.ndarray, fs: int, lambda_reg: float) -> np.ndarray:
-    print("Performing Tikhonov spectral division...")
+    logger.debug("Performing Tikhonov spectral division...")
     N = max(len(recorded), len(ir))
-    X = fft(recorded, n=N)
-    H = fft(ir, n=N)
+    n_fft = fft_engine.next_fast_len(N)
+    X = fft_engine.rfft(recorded, n=n_fft)
+    H = fft_engine.rfft(ir, n=n_fft)
 
     phase_X = np.angle(X)
     mag_X = np.abs(X)
@@ -22,15 +26,17 @@ def spectral_division(recorded: np.ndarray, ir: np.ndarray, fs: int, lambda_reg:
 
     mag_Y = mag_X / (mag_H + lambda_reg)
     Y = mag_Y * np.exp(1j * phase_X)
-    y = np.real(ifft(Y))
+    y = fft_engine.irfft(Y, n=n_fft)[:N]
     return y
 
 
+@metrics.timed("mmse_deconvolve")
 def mmse_deconvolve(recorded: np.ndarray, ir: np.ndarray, fs: int, noise_floor: float = 1e-4) -> np.ndarray:
-    print("Performing MMSE deconvolution")
+    logger.debug("Performing MMSE deconvolution")
     N = max(len(recorded), len(ir))
-    X = fft(recorded, n=N)
-    H = fft(ir, n=N)
+    n_fft = fft_engine.next_fast_len(N)
+    X = fft_engine.rfft(recorded, n=n_fft)
+    H = fft_engine.rfft(ir, n=n_fft)
 
     H_conj = np.conj(H)
     H_power = np.abs(H)**2
@@ -39,57 +45,81 @@ def mmse_deconvolve(recorded: np.ndarray, ir: np.ndarray, fs: int, noise_floor:
 
     MMSE_filter = H_conj / (H_power + noise_power)
     S_hat = MMSE_filter * X
-    recovered = np.real(ifft(S_hat))
+    recovered = fft_engine.irfft(S_hat, n=n_fft)[:N]
     return recovered
 
 
+@metrics.timed("apply_spectral_gating")
 def apply_spectral_gating(signal: np.ndarray, fs: int, passes: int = 2) -> np.ndarray:
-    print("Applying spectral gating...")
-    win_size = 512
-    hop = win_size // 2
-    window = np.hamming(win_size)
+    logger.debug("Applying spectral gating...")
+    return spectral_gating.gate_signal(signal, fs, passes)
 
-    for _ in range(passes):
-        if len(signal) < win_size:
-            signal = np.pad(signal, (0, win_size - len(signal)))
-        f, t, S = spectrogram(signal, fs, window=window, nperseg=win_size, noverlap=hop, mode='complex')
-        mag = np.abs(S)
 
-        noise_floor = np.median(mag[-50:, :])
-        threshold = 1.5 * noise_floor
+@lru_cache(maxsize=config.NOTCH_CACHE_SIZE)
+def design_notch_sos(fs: int, f_center: float, bw: float = 100) -> np.ndarray:
+    """Second-order sections of one band-stop notch; cached by (fs, center, bandwidth)."""
+    from scipy.signal import butter
 
-        mask = mag < threshold
-        S[mask] *= 0.1
+    low = max((f_center - bw/2) / (fs/2), 0.01)
+    high = min((f_center + bw/2) / (fs/2), 0.99)
+    if low >= high:
+        return np.zeros((0, 6))
+    sos = butter(2, [low, high], btype='bandstop', output='sos')
+    sos.setflags(write=False)
+    return sos
 
-        _, signal = istft(S, fs, window=window, nperseg=win_size, noverlap=hop)
-    return signal
 
+def find_notch_peaks(signal: np.ndarray, fs: int) -> np.ndarray:
+    """Centre frequencies of spectral peaks above NOTCH_THRESHOLD, from a Welch estimate."""
+    from scipy.signal import find_peaks, welch
+
+    nperseg = min(len(signal), config.NOTCH_WELCH_NPERSEG)
+    f, psd = welch(signal, fs, nperseg=nperseg)
+    spectrum = np.sqrt(psd)
+    peaks, _ = find_peaks(spectrum, height=config.NOTCH_THRESHOLD * np.max(spectrum))
 
+    # Refine centres between Welch bins by parabolic interpolation of the log
+    # spectrum; rounding to 0.1 Hz keeps repeated hum lines on cached designs.
+    log_spec = np.log(spectrum + 1e-20)
+    alpha, beta, gamma = log_spec[peaks - 1], log_spec[peaks], log_spec[peaks + 1]
+    denom = alpha - 2 * beta + gamma
+    offset = np.where(denom != 0, 0.5 * (alpha - gamma) / np.where(denom != 0, denom, 1), 0.0)
+    return np.round(f[peaks] + offset * (f[1] - f[0]), 1)
+
+
+@metrics.timed("apply_notch_filters")
 def apply_notch_filters(signal: np.ndarray, fs: int, passes: int = 2) -> np.ndarray:
-    print("Applying notch filters...")
+    from scipy.signal import sosfiltfilt
+
+    logger.debug("Applying notch filters...")
+    dtype = fft_engine.real_dtype()
+    signal = np.asarray(signal, dtype=dtype)
+    bw = 100  # notch width
     for _ in range(passes):
-        N = len(signal)
-        spectrum = np.abs(fft(signal, n=N))[:N//2]
-        peaks, _ = find_peaks(spectrum, height=config.NOTCH_THRESHOLD * np.max(spectrum))
-        for peak in peaks:
-            f_center = peak * fs / N
-            bw = 100  # notch width
-            low = max((f_center - bw/2) / (fs/2), 0.01)
-            high = min((f_center + bw/2) / (fs/2), 0.99)
-            if low < high:
-                b, a = butter(2, [low, high], btype='bandstop')
-                signal = filtfilt(b, a, signal)
+        centers = find_notch_peaks(signal, fs)
+        sections = [design_notch_sos(fs, float(f_center), bw) for f_center in centers]
+        sections = [sos for sos in sections if len(sos)]
+        if not sections:
+            break
+        # One zero-phase pass over the whole cascade instead of a filtfilt per notch
+        signal = sosfiltfilt(np.vstack(sections).astype(dtype, copy=False), signal)
     return signal
 
 
+@metrics.timed("apply_filters")
 def apply_filters(signal: np.ndarray, fs: int) -> np.ndarray:
-    print("Applying band-pass filtering...")
+    from scipy.signal import butter, filtfilt
+
+    logger.debug("Applying band-pass filtering...")
+    # Coefficients in the working dtype keep scipy from promoting float32 signals
+    dtype = fft_engine.real_dtype()
+    signal = np.asarray(signal, dtype=dtype)
     b_hp, a_hp = butter(2, config.IR_HIGH_PASS / (fs / 2), btype='high')
-    signal = filtfilt(b_hp, a_hp, signal)
+    signal = filtfilt(b_hp.astype(dtype), a_hp.astype(dtype), signal)
 
     if config.IR_LOW_PASS < fs / 2:
         b_lp, a_lp = butter(2, config.IR_LOW_PASS / (fs / 2), btype='low')
-        signal = filtfilt(b_lp, a_lp, signal)
+        signal = filtfilt(b_lp.astype(dtype), a_lp.astype(dtype), signal)
 
     return signal
 
@@ -100,30 +130,43 @@ def normalize(signal: np.ndarray, peak: float = 0.999) -> np.ndarray:
 
 import numpy as np
 
-def offline_deconvolve(signal, ir, fs, gain=1.0):
-    print("[Offline Deconvolution] Starting...")
-    print(f"  Signal shape: {signal.shape}, IR shape: {ir.shape}, Gain: {gain}")
-
+def _ir_spectrum(ir, n_fft, ir_spectrum=None) -> np.ndarray:
+    """rfft(ir, n_fft) at the working precision, from `ir_spectrum` when supplied."""
+    if ir_spectrum is None:
+        return fft_engine.rfft(ir, n=n_fft)
+    return np.asarray(ir_spectrum(n_fft), dtype=fft_engine.complex_dtype())
+
+@metrics.timed("offline_deconvolve")
+def offline_deconvolve(signal, ir, fs, gain=1.0, ir_spectrum=None):
+    """
+    Regularised spectral division of `signal` by `ir`.
+    `ir_spectrum` optionally supplies rfft(ir, n_fft) for a given n_fft (e.g. from ir_store).
+    """
     if signal is None or len(signal) == 0:
-        print("❌ Error: Signal is empty!")
+        logger.error("Signal is empty!")
         return np.zeros(44100)
 
     if ir is None or len(ir) == 0:
-        print("❌ Error: IR is empty!")
+        logger.error("IR is empty!")
         return np.zeros(44100)
 
+    logger.debug("Offline deconvolution: signal %s, IR %s, gain %s", signal.shape, ir.shape, gain)
+
     # Normalize input
     signal = np.nan_to_num(signal).astype(np.float32)
     ir = np.nan_to_num(ir).astype(np.float32)
 
     n = len(signal) + len(ir) - 1
-    print(f"  Performing FFT of length: {n}")
+    n_fft = fft_engine.next_fast_len(n)
+    logger.debug("Performing FFT of length: %d", n_fft)
 
-    SIG = np.fft.fft(signal, n=n)
-    IR = np.fft.fft(ir, n=n)
+    SIG = fft_engine.rfft(signal, n=n_fft)
+    IR = _ir_spectrum(ir, n_fft, ir_spectrum)
 
     eps = 1e-8  # avoid division by zero
-    recovered = np.fft.ifft(SIG / (IR + eps)).real
+    SIG /= IR + eps
+    recovered = fft_engine.irfft(SIG, n=n_fft)[:n]
+    del SIG
 
     recovered *= gain
     recovered = np.nan_to_num(recovered)
@@ -131,19 +174,202 @@ def offline_deconvolve(signal, ir, fs, gain=1.0):
     # Clip to [-1, 1] for WAV saving
     recovered = np.clip(recovered, -1.0, 1.0)
 
-    print(f"  Output shape: {recovered.shape}")
-    print(f"  Output min: {recovered.min():.5f}, max: {recovered.max():.5f}, mean: {recovered.mean():.5f}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Output shape: %s, min: %.5f, max: %.5f, mean: %.5f",
+                     recovered.shape, recovered.min(), recovered.max(), recovered.mean())
 
-    if np.all(recovered == 0):
-        print("⚠️ Warning: Output signal is entirely zero.")
-    elif np.any(np.isnan(recovered)) or np.any(np.isinf(recovered)):
-        print("❌ Error: Output contains NaNs or Infs.")
+    if not np.any(recovered):
+        logger.warning("Output signal is entirely zero.")
+    elif not np.all(np.isfinite(recovered)):
+        logger.error("Output contains NaNs or Infs.")
 
     return recovered
 
 
 
-def save_output_audio(signal: np.ndarray, fs: int, filename: str = "temp_uploads/recovered.wav") -> str:
+def offline_deconvolve_batch(signals, ir, fs, gain=1.0, max_rows: int = config.BATCH_MAX_ROWS,
+                             ir_spectrum=None):
+    """
+    Deconvolve many signals against one IR, yielding (index, recovered) per signal.
+
+    Signals are grouped by padded FFT size; the IR spectrum is computed once per
+    size and each group is transformed as one 2-D array (at most `max_rows` rows
+    at a time). Each result equals offline_deconvolve(signal, ir, fs, gain).
+    `ir_spectrum` optionally supplies rfft(ir, n_fft) for a given n_fft.
+    """
+    logger.debug("Batch deconvolution: %d signals, gain %s", len(signals), gain)
+
+    if ir is None or len(ir) == 0:
+        logger.error("IR is empty!")
+        for i in range(len(signals)):
+            yield i, np.zeros(44100)
+        return
+
+    ir = np.nan_to_num(ir).astype(np.float32)
+    eps = 1e-8  # avoid division by zero
+
+    groups = {}
+    for i, signal in enumerate(signals):
+        if signal is None or len(signal) == 0:
+            logger.error("Signal %d is empty!", i)
+            yield i, np.zeros(44100)
+            continue
+        n = len(signal) + len(ir) - 1
+        groups.setdefault(fft_engine.next_fast_len(n), []).append(i)
+
+    for n_fft, indices in groups.items():
+        IR = _ir_spectrum(ir, n_fft, ir_spectrum)
+        logger.debug("FFT length %d: %d signal(s)", n_fft, len(indices))
+
+        for start in range(0, len(indices), max_rows):
+            rows = indices[start:start + max_rows]
+            lengths = [len(signals[i]) for i in rows]
+            stacked = np.zeros((len(rows), max(lengths)), dtype=np.float32)
+            for r, i in enumerate(rows):
+                signal = np.asarray(signals[i])
+                if signal.ndim > 1:
+                    signal = signal[:, 0]
+                stacked[r, :lengths[r]] = np.nan_to_num(signal)
+
+            with metrics.stage("offline_deconvolve_batch"):
+                SIG = fft_engine.rfft(stacked, n=n_fft, axis=-1)
+                SIG /= IR + eps
+                recovered = fft_engine.irfft(SIG, n=n_fft, axis=-1)
+                del SIG
+
+            for r, i in enumerate(rows):
+                y = recovered[r, :lengths[r] + len(ir) - 1] * gain
+                y = np.clip(np.nan_to_num(y), -1.0, 1.0)
+                yield i, y
+
+
+def design_inverse_kernel(ir: np.ndarray, taps: int = config.STREAM_INVERSE_TAPS,
+                          tolerance: float = config.STREAM_INVERSE_TOLERANCE,
+                          max_taps: int = config.STREAM_INVERSE_MAX_TAPS) -> np.ndarray:
+    """
+    Two-sided inverse of `ir` (same division as offline_deconvolve), centred at taps // 2.
+
+    The inverse of an IR with deep spectral dips decays slowly, so `taps` is only
+    the starting length: it doubles until the RMS of the inverse outside the
+    window is below `tolerance` relative to the whole. Raises ValueError if that
+    needs more than `max_taps`.
+    """
+    ir = np.nan_to_num(ir).astype(np.float32)
+    taps = max(taps, 2 * len(ir))
+    eps = 1e-8  # same bias as offline_deconvolve
+    while taps <= max_taps:
+        # Designed at twice the length, the part outside the central `taps`
+        # samples is what truncating to `taps` would drop or wrap around.
+        n = 2 * taps
+        g = np.roll(fft_engine.irfft(1.0 / (fft_engine.rfft(ir, n=n) + eps), n=n), taps)
+        kernel = g[taps // 2:taps // 2 + taps]
+        energy = np.sum(np.square(g, dtype=np.float64))
+        outside = energy - np.sum(np.square(kernel, dtype=np.float64))
+        if outside <= tolerance ** 2 * energy:
+            logger.debug("Inverse kernel: %d taps, truncation %.2g", taps, np.sqrt(outside / energy))
+            return np.ascontiguousarray(kernel)
+        taps *= 2
+    raise ValueError(f"Inverse of the IR does not decay within {max_taps} taps; "
+                     "use the in-memory deconvolution for this IR.")
+
+
+def offline_deconvolve_stream(blocks, ir, fs, gain=1.0, taps=config.STREAM_INVERSE_TAPS):
+    """
+    Block-streaming version of offline_deconvolve.
+
+    Consumes an iterable of 1-D input blocks and yields recovered blocks using
+    overlap-save against a two-sided inverse kernel, so memory stays bounded by
+    the kernel length regardless of recording length. The concatenated output
+    has the same length as offline_deconvolve (len(signal) + len(ir) - 1). Away
+    from the edges, where the full-length FFT wraps circularly, it matches to
+    about STREAM_INVERSE_TOLERANCE relative RMS error, limited below that by
+    float32 rounding amplified by the inverse (about 1e-4 for IRs with dips
+    near -40 dB).
+    """
+    logger.debug("Streaming deconvolution starting...")
+    kernel = design_inverse_kernel(ir, taps)
+    M = len(kernel)
+    delay = M // 2
+    nfft = 2 * M
+    step = nfft - M + 1
+    K = fft_engine.rfft(kernel, n=nfft)
+
+    frame = np.zeros(nfft, dtype=fft_engine.real_dtype())
+    fill = 0
+    skip = delay
+
+    def _process(count):
+        nonlocal skip
+        y = fft_engine.irfft(fft_engine.rfft(frame) * K, n=nfft)[M - 1:M - 1 + count]
+        # Slide the last M - 1 inputs to the front as history for the next frame
+        frame[:M - 1] = frame[count:count + M - 1]
+        frame[M - 1:] = 0.0
+        if skip:
+            dropped = min(skip, len(y))
+            y = y[dropped:]
+            skip -= dropped
+        y = np.nan_to_num(y * gain)
+        return np.clip(y, -1.0, 1.0)
+
+    def _feed(x):
+        nonlocal fill
+        pos = 0
+        while pos < len(x):
+            take = min(step - fill, len(x) - pos)
+            frame[M - 1 + fill:M - 1 + fill + take] = x[pos:pos + take]
+            fill += take
+            pos += take
+            if fill == step:
+                fill = 0
+                yield _process(step)
+
+    total = 0
+    for block in blocks:
+        block = np.nan_to_num(np.asarray(block)).astype(np.float32)
+        if block.ndim > 1:
+            block = block[:, 0]
+        total += len(block)
+        for out in _feed(block):
+            if len(out):
+                yield out
+
+    if total == 0:
+        logger.error("Signal is empty!")
+        return
+
+    # Flush: the IR tail plus the anti-causal half of the kernel
+    for out in _feed(np.zeros(len(ir) - 1 + delay)):
+        if len(out):
+            yield out
+    if fill:
+        out = _process(fill)
+        if len(out):
+            yield out
+
+    logger.debug("Streamed %d samples through a %d-tap inverse kernel", total, M)
+
+
+@metrics.timed("offline_deconvolve_file")
+def offline_deconvolve_file(input_path, ir, output_path, gain=1.0,
+                            block_size: int = config.STREAM_BLOCK_SIZE, subtype: str = config.OUTPUT_SUBTYPE) -> str:
+    """
+    Deconvolve a WAV file (or an open AudioSource) block by block, writing
+    output blocks as they are produced.
+    """
+    os.makedirs(os.path.dirname(str(output_path)) or ".", exist_ok=True)
+    source = input_path if isinstance(input_path, AudioSource) else AudioSource(input_path)
+    with source as src, AudioWriter(output_path, src.fs, subtype=subtype) as dst:
+        blocks = src.chunks(block_size, channel=0)   # float32 in either precision
+        for out in offline_deconvolve_stream(blocks, ir, src.fs, gain=gain):
+            dst.write(out)
+    return str(output_path)
+
+
+def save_output_audio(signal: np.ndarray, fs: int, filename: str = "temp_uploads/recovered.wav",
+                      subtype: str = config.OUTPUT_SUBTYPE) -> str:
     os.makedirs(os.path.dirname(filename), exist_ok=True)
-    sf.write(filename, signal, fs)
+    signal = np.asarray(signal)
+    with AudioWriter(filename, fs, 1 if signal.ndim == 1 else signal.shape[1], subtype=subtype) as out:
+        for start in range(0, len(signal), config.AUDIO_CHUNK):
+            out.write(signal[start:start + config.AUDIO_CHUNK])
     return filename
\ No newline at end of file
@@ -1,34 +1,140 @@
-import matplotlib.pyplot as plt
+import threading
+
 import numpy as np
 from pathlib import Path
 
-PLOT_DIR = Path("temp_plots")
-PLOT_DIR.mkdir(exist_ok=True)
+from . import config, fft_engine, metrics
 
-def plot_time(signal: np.ndarray, fs: int, title: str = "Time Domain", filename: str = "plot_time.png") -> str:
-    plt.figure(figsize=(10, 3))
-    t = np.arange(len(signal)) / fs
-    plt.plot(t, signal)
-    plt.title(title)
-    plt.xlabel("Time (s)")
-    plt.ylabel("Amplitude")
-    plt.tight_layout()
-    out_path = PLOT_DIR / filename
-    plt.savefig(out_path)
-    plt.close()
+PLOT_DIR = Path(config.PLOT_DIR)
+
+FIGSIZE = (10, 3)
+PLOT_WIDTH = int(FIGSIZE[0] * config.PLOT_DPI)   # Axes never need more points than this
+
+# One Agg figure per plot kind, reused across calls (pyplot is not involved, so
+# nothing accumulates in a global figure manager). matplotlib is imported with
+# the first figure.
+_figures = {}
+_lock = threading.Lock()
+
+
+def envelope(signal: np.ndarray, fs: int, width: int = PLOT_WIDTH):
+    """
+    Min/max envelope of `signal` over `width` equal time bins.
+    Returns (bin start times, minima, maxima); short signals are returned as is.
+    """
+    signal = np.asarray(signal).reshape(len(signal), -1)[:, 0]
+    n = len(signal)
+    if n <= 2 * width:
+        t = np.arange(n) / fs
+        return t, signal, signal
+
+    step = -(-n // width)  # ceil
+    full = (n // step) * step
+    body = signal[:full].reshape(-1, step)
+    lo, hi = body.min(axis=1), body.max(axis=1)
+    if full < n:
+        tail = signal[full:]
+        lo = np.append(lo, tail.min())
+        hi = np.append(hi, tail.max())
+    t = np.arange(len(lo)) * step / fs
+    return t, lo, hi
+
+
+def spectrum(signal: np.ndarray, fs: int, nperseg: int = config.PLOT_WELCH_NPERSEG,
+             max_segments: int = config.PLOT_WELCH_MAX_SEGMENTS):
+    """
+    Welch power spectral density in dB at a fixed resolution of fs / nperseg.
+    Long signals average `max_segments` evenly spaced segments instead of every
+    half-overlapping one, so the cost does not grow with the recording length.
+    """
+    signal = np.asarray(signal).reshape(len(signal), -1)[:, 0]
+    n = len(signal)
+    nperseg = min(nperseg, n)
+    hop = max(1, nperseg // 2)
+    count = 1 + (n - nperseg) // hop
+    if count > max_segments:
+        starts = np.linspace(0, n - nperseg, max_segments).astype(int)
+    else:
+        starts = np.arange(count) * hop
+
+    frames = np.lib.stride_tricks.sliding_window_view(signal, nperseg)[starts].astype(np.float64)
+    frames -= frames.mean(axis=1, keepdims=True)
+    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(nperseg) / nperseg)   # periodic Hann, as in welch
+    frames *= window
+    psd = np.mean(np.abs(fft_engine.rfft(frames, axis=-1)) ** 2, axis=0)
+    psd /= fs * np.sum(window ** 2)
+    psd[1:len(psd) - (nperseg % 2 == 0)] *= 2   # one-sided, DC and Nyquist counted once
+    f = np.arange(len(psd)) * fs / nperseg
+    return f, 10 * np.log10(psd + 1e-20)
+
+
+def _figure(kind: str, xlabel: str, ylabel: str):
+    entry = _figures.get(kind)
+    if entry is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=FIGSIZE, dpi=config.PLOT_DPI)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        line, = ax.plot([], [], linewidth=0.8)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        entry = _figures[kind] = (fig, ax, line)
+    return entry
+
+
+def _render(kind, x, y, title, xlabel, ylabel, filename) -> str:
+    with _lock:
+        fig, ax, line = _figure(kind, xlabel, ylabel)
+        line.set_data(x, y)
+        ax.set_title(title)
+        ax.relim()
+        ax.autoscale_view()
+        fig.tight_layout()
+        PLOT_DIR.mkdir(exist_ok=True)
+        out_path = PLOT_DIR / filename
+        fig.savefig(out_path)
     return str(out_path)
 
+
+@metrics.timed("plot_time")
+def plot_time(signal: np.ndarray, fs: int, title: str = "Time Domain", filename: str = "plot_time.png") -> str:
+    t, lo, hi = envelope(signal, fs)
+    # Alternate min and max per bin so a single line traces the envelope
+    x = np.repeat(t, 2)
+    y = np.column_stack((lo, hi)).ravel()
+    return _render("time", x, y, title, "Time (s)", "Amplitude", filename)
+
+
+@metrics.timed("plot_freq")
 def plot_freq(signal: np.ndarray, fs: int, title: str = "Frequency Domain", filename: str = "plot_freq.png") -> str:
-    plt.figure(figsize=(10, 3))
-    N = len(signal)
-    f = np.fft.rfftfreq(N, d=1/fs)
-    spectrum = np.abs(np.fft.rfft(signal))
-    plt.plot(f, spectrum)
-    plt.title(title)
-    plt.xlabel("Frequency (Hz)")
-    plt.ylabel("Magnitude")
-    plt.tight_layout()
-    out_path = PLOT_DIR / filename
-    plt.savefig(out_path)
-    plt.close()
-    return str(out_path)
+    f, db = spectrum(signal, fs)
+    return _render("freq", f, db, title, "Frequency (Hz)", "Power (dB/Hz)", filename)
+
+
+def plot_data(signal: np.ndarray, fs: int, kind: str = "time", width: int = PLOT_WIDTH) -> dict:
+    """
+    Decimated plot arrays for client-side drawing.
+    `time`: min/max per bin of `bin_seconds`; `freq`: Welch PSD in dB every `df` Hz.
+    """
+    if kind == "time":
+        t, lo, hi = envelope(signal, fs, width)
+        bin_seconds = float(t[1] - t[0]) if len(t) > 1 else 1.0 / fs
+        return {
+            "kind": "time",
+            "fs": fs,
+            "duration": len(signal) / fs,
+            "bin_seconds": bin_seconds,
+            "min": lo.astype(np.float32),
+            "max": hi.astype(np.float32),
+        }
+    if kind == "freq":
+        f, db = spectrum(signal, fs)
+        return {
+            "kind": "freq",
+            "fs": fs,
+            "df": float(f[1] - f[0]) if len(f) > 1 else float(fs),
+            "db": db.astype(np.float32),
+        }
+    raise ValueError(f"Unknown plot kind '{kind}', expected 'time' or 'freq'.")
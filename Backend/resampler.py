@@ -0,0 +1,131 @@
+# noise_cleanse/resampler.py
+
+"""
+Rational-ratio polyphase resampling.
+
+The rate ratio is reduced to up/down; a Kaiser-windowed sinc low-pass is
+designed once per ratio (as in scipy.signal.resample_poly) and split into
+`up` phases. Only the output samples are computed, each as a dot product of
+one phase with the last few input samples, so the cost is linear in the
+signal length and memory is bounded by the chunk size.
+"""
+
+import logging
+from fractions import Fraction
+from math import gcd
+
+import numpy as np
+
+from . import config, fft_engine
+from .cache import ArrayCache, content_key
+
+logger = logging.getLogger(__name__)
+
+_designs = ArrayCache(config.RESAMPLE_DESIGN_CACHE_SIZE)
+
+
+def ratio(fs_in: int, fs_out: int) -> tuple:
+    """(up, down) with fs_out / fs_in == up / down, approximated if the terms are too large."""
+    fs_in, fs_out = int(fs_in), int(fs_out)
+    if fs_in <= 0 or fs_out <= 0:
+        raise ValueError(f"Sample rates must be positive, got {fs_in} -> {fs_out}.")
+    g = gcd(fs_in, fs_out)
+    up, down = fs_out // g, fs_in // g
+    if max(up, down) > config.RESAMPLE_MAX_TERM:
+        approx = Fraction(up, down).limit_denominator(config.RESAMPLE_MAX_TERM)
+        while max(approx.numerator, approx.denominator) > config.RESAMPLE_MAX_TERM:
+            approx = Fraction(up, down).limit_denominator(approx.denominator // 2)
+        logger.warning("Resampling %d -> %d Hz approximated as %d/%d.",
+                       fs_in, fs_out, approx.numerator, approx.denominator)
+        up, down = approx.numerator, approx.denominator
+    return up, down
+
+
+def design(up: int, down: int) -> np.ndarray:
+    """
+    Polyphase filter bank for up/down, shape (up, taps) with each phase reversed
+    so that phase p applied to x[i - taps + 1 .. i] gives one output sample.
+    """
+    half_len = config.RESAMPLE_HALF_TAPS * max(up, down)
+    key = content_key("polyphase", up, down, half_len, config.RESAMPLE_KAISER_BETA)
+
+    def compute():
+        cutoff = 1.0 / max(up, down)
+        n = np.arange(2 * half_len + 1) - half_len
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * half_len + 1, config.RESAMPLE_KAISER_BETA)
+        h *= up / np.sum(h)
+        taps = -(-len(h) // up)
+        bank = np.zeros(taps * up)
+        bank[:len(h)] = h
+        return bank.reshape(taps, up).T[:, ::-1].copy()
+
+    return _designs.get_or_compute(key, compute)
+
+
+class StreamResampler:
+    """
+    Stateful polyphase resampler for audio arriving in blocks of any size.
+    Output is aligned with the input (the filter delay is absorbed at the
+    start), so `process` yields fewer samples at first and `flush` returns
+    the tail. Blocks are 1-D or (samples, channels).
+    """
+
+    def __init__(self, fs_in: int, fs_out: int, channels: int = None):
+        self.fs_in, self.fs_out = int(fs_in), int(fs_out)
+        self.up, self.down = ratio(fs_in, fs_out)
+        self.bank = design(self.up, self.down).astype(fft_engine.real_dtype(), copy=False)
+        self.delay = config.RESAMPLE_HALF_TAPS * max(self.up, self.down)   # in upsampled samples
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        taps = self.bank.shape[1]
+        shape = (taps - 1,) if self.channels is None else (taps - 1, self.channels)
+        self._history = np.zeros(shape, dtype=self.bank.dtype)
+        self._next = self.delay   # upsampled position of the next output, relative to the block
+        self._consumed = 0
+        self._produced = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        block = np.asarray(block, dtype=self.bank.dtype)
+        n = len(block)
+        self._consumed += n
+        buf = np.concatenate((self._history, block))
+        self._history = buf[n:]
+        if self._next >= n * self.up:
+            self._next -= n * self.up
+            return buf[:0]
+
+        start = self._next
+        count = -(-(n * self.up - start) // self.down)
+        self._next = start + count * self.down - n * self.up
+        self._produced += count
+
+        # Outputs r, r + up, r + 2 * up, ... share a phase and step `down` inputs apart
+        windows = np.lib.stride_tricks.sliding_window_view(buf, self.bank.shape[1], axis=0)
+        out = np.empty((count,) + buf.shape[1:], dtype=buf.dtype)
+        for r in range(min(self.up, count)):
+            i, p = divmod(start + r * self.down, self.up)
+            rows = out[r::self.up]
+            rows[...] = windows[i:i + (len(rows) - 1) * self.down + 1:self.down] @ self.bank[p]
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Remaining output for the input seen so far; the resampler is reset afterwards."""
+        total = -(-self._consumed * self.up // self.down)
+        produced = self._produced
+        shape = (self.bank.shape[1],) + self._history.shape[1:]
+        tail = self.process(np.zeros(shape, dtype=self.bank.dtype))[:max(0, total - produced)]
+        self.reset()
+        return tail
+
+
+def resample(signal: np.ndarray, fs_in: int, fs_out: int, chunk: int = config.RESAMPLE_CHUNK) -> np.ndarray:
+    """Resample `signal` (1-D or samples x channels) to ceil(len * fs_out / fs_in) samples."""
+    signal = np.asarray(signal)
+    if int(fs_in) == int(fs_out):
+        return signal
+    stream = StreamResampler(fs_in, fs_out, None if signal.ndim == 1 else signal.shape[1])
+    parts = [stream.process(signal[i:i + chunk]) for i in range(0, len(signal), chunk)]
+    parts.append(stream.flush())
+    return np.concatenate(parts)
@@ -1,12 +1,22 @@
-from fastapi import FastAPI, UploadFile, File, Query, HTTPException
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import shutil
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+import asyncio
+import json
+import logging
+from concurrent.futures import CancelledError
+from functools import partial
 import uuid
 from pathlib import Path
 import soundfile as sf
 import numpy as np
-import sounddevice as sd
 from Backend import plotting
 from typing import Optional
 from uuid import uuid4
@@ -15,12 +25,23 @@ import os
 from pathlib import Path
 from .impulse_response import run_full_ir
 
-from Backend import config, impulse_response, offline_deconvolution, live_deconvolution
+from Backend import audio_io, config, impulse_response, offline_deconvolution, live_deconvolution, jobs, ir_store, metrics, spectrogram, devices, uploads, results, storage
+
+logger = logging.getLogger(__name__)
+
+# Seconds from the start of this module's import to import done / app ready
+startup_times = {}
 
-UPLOAD_DIR = Path("temp_uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    config.ensure_dirs()
+    storage.start_sweeper()
+    startup_times["ready"] = time.perf_counter() - _import_started
+    logger.info("NoiseCleanse API ready in %.3f s%s.", startup_times["ready"], " (headless)" if config.HEADLESS else "")
+    yield
+    storage.stop_sweeper()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,61 +49,151 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.mount("/output", StaticFiles(directory="output"), name="output")
-app.mount("/temp_plots", StaticFiles(directory="temp_plots"), name="plots")
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Counts requests and, if enabled, reports per-stage timings in a Server-Timing header."""
+    token = metrics.begin_request()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        timings = metrics.end_request(token)
+    route = request.scope.get("route")
+    metrics.inc("http_requests_total", path=getattr(route, "path", "unmatched"),
+                method=request.method, status=response.status_code, help="HTTP requests by route and status.")
+    if config.METRICS_TIMING_HEADERS:
+        response.headers["Server-Timing"] = metrics.server_timing(timings, time.perf_counter() - start)
+    return response
+
+# Directories are created at startup, not on import
+app.mount("/output", StaticFiles(directory="output", check_dir=False), name="output")
+app.mount("/temp_plots", StaticFiles(directory=config.PLOT_DIR, check_dir=False), name="plots")
+
+@app.exception_handler(devices.DeviceUnavailableError)
+async def device_unavailable(request: Request, exc: devices.DeviceUnavailableError):
+    return JSONResponse(status_code=503, content={"status": "unavailable", "reason": str(exc)})
+
+@app.exception_handler(uploads.UploadTooLargeError)
+async def upload_too_large(request: Request, exc: uploads.UploadTooLargeError):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+@app.exception_handler(uploads.UploadFormatError)
+async def upload_unreadable(request: Request, exc: uploads.UploadFormatError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+def _require_audio():
+    """Dependency for device endpoints: 503 "unavailable" when headless or without PortAudio."""
+    devices.sounddevice()
+
+@metrics.register_collector
+def _collect_startup():
+    samples = [({"phase": phase}, round(seconds, 6)) for phase, seconds in startup_times.items()]
+    return [("startup_seconds", "gauge", "Seconds from API module import to each startup phase.", samples)]
 
 
 recorder = None
 last_uploaded_signal = None
 last_uploaded_ir = None
+selected_ir_id = None
+latest_result = None   # Result key of the most recently finished deconvolution
+pending_results = {}   # Result key -> ID of the job computing it
 
-@app.post("/api/record/start")
+def _recovered_path() -> str:
+    """Latest result, or the CLI's RECOVERED_FILE before any job has run."""
+    path = results.lookup(latest_result) if latest_result else None
+    return path or config.RECOVERED_FILE
+
+def _retain_signal(path):
+    """Make `path` the signal for requests without one, holding it against the storage sweeper."""
+    global last_uploaded_signal
+    storage.acquire(path)
+    if last_uploaded_signal is not None:
+        storage.release(last_uploaded_signal)
+    last_uploaded_signal = path
+
+def _recovered():
+    """(samples, fs) of the latest result, from the result cache's memory tier when possible."""
+    try:
+        src = results.open_result(latest_result)
+    except KeyError:
+        src = audio_io.AudioSource(config.RECOVERED_FILE)
+    with src:
+        return src.read(), src.fs
+
+def _track_result(job_id: str, key: str):
+    def done():
+        global latest_result
+        pending_results.pop(key, None)
+        if jobs.status(job_id)["status"] == "done":
+            results.commit(key)
+            latest_result = key
+    jobs.on_done(job_id, done)
+
+def _part(parts: list, name: str):
+    """First decoded upload part called `name`, or None."""
+    return next((p for p in parts if p.name == name), None)
+
+def _resolve_ir(ir: Optional[uploads.DecodedUpload], ir_id: Optional[str]) -> str:
+    """Register an uploaded IR, or validate an IR ID, falling back to the selected IR."""
+    if ir is not None:
+        return ir_store.register(ir.read(), ir.fs, name=ir.filename)["ir_id"]
+    ir_id = ir_id or selected_ir_id
+    if ir_id is None:
+        raise HTTPException(400, "No IR provided or preloaded.")
+    try:
+        ir_store.get_meta(ir_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+    return ir_id
+
+@app.post("/api/record/start", dependencies=[Depends(_require_audio)])
 def start_recording():
     global recorder
     if recorder is not None:
         return {"status": "error", "message": "Recording already in progress."}
     duration_seconds = 10
     fs = config.FS
-    print("🎙️ Starting recording...")
-    recorder = sd.rec(int(duration_seconds * fs), samplerate=fs, channels=1)
+    logger.info("Starting recording...")
+    recorder = devices.sounddevice().rec(int(duration_seconds * fs), samplerate=fs, channels=1)
     return {"status": "recording started"}
 
-@app.post("/api/record/stop")
+@app.post("/api/record/stop", dependencies=[Depends(_require_audio)])
 def stop_recording():
-    global recorder, last_uploaded_signal
+    global recorder
     if recorder is None:
         return {"status": "error", "message": "No recording in progress."}
 
-    print("⏹️ Stopping recording...")
-    sd.wait()
+    logger.info("Stopping recording...")
+    devices.sounddevice().wait()
     recorded_data = recorder
     recorder = None
 
-    print(f"🎤 Recorded shape: {recorded_data.shape}, dtype: {recorded_data.dtype}, size: {recorded_data.size}")
+    logger.debug("Recorded shape: %s, dtype: %s, size: %d", recorded_data.shape, recorded_data.dtype, recorded_data.size)
 
     if recorded_data.size < 10:
         return {"status": "error", "message": "Recording too short or failed."}
 
     output_path = Path("output") / "speech_recorded.wav"
-    print(f"💾 Saving to: {output_path}")
+    logger.debug("Saving to: %s", output_path)
     sf.write(output_path, recorded_data, config.FS)
-    last_uploaded_signal = output_path
+    _retain_signal(output_path)
 
     return {
         "status": "recorded",
         "file": str(output_path)
     }
 
-@app.post("/api/ir/full/offline")
+@app.post("/api/ir/full/offline", dependencies=[Depends(_require_audio)])
 def run_full_ir_offline():
     try:
         output_path = impulse_response.run_full_ir()
         return {"status": "IR recorded", "output": str(output_path)}
     except Exception as e:
-        print(f"IR recording failed: {e}")
+        logger.error("IR recording failed: %s", e)
         raise HTTPException(status_code=500, detail="Failed to record impulse response.")
 
-@app.post("/api/ir/full/live")
+@app.post("/api/ir/full/live", dependencies=[Depends(_require_audio)])
 def run_full_ir_live():
     path = impulse_response.run_full_ir()
     ir_data, _ = sf.read(path)
@@ -101,60 +212,277 @@ from uuid import uuid4
 
 @app.post("/api/deconvolve")
 async def deconvolve(
-    signal: Optional[UploadFile] = File(None),
-    ir:     UploadFile | None    = File(None),
-    gain:   float                = Query(default=1.0)
+    request: Request,
+    ir_id:  Optional[str]        = Query(default=None),
+    gain:   float                = Query(default=1.0),
+    stream: bool                 = Query(default=False),
+    wait:   bool                 = Query(default=True),
+    retain: bool                 = Query(default=False)
 ):
     """
     Runs offline deconvolution.
-    If `signal` is omitted, falls back to the WAV recorded via /api/record/stop.
-    Always saves the recovered audio to output/recovered_output.wav and returns
-    a RELATIVE URL that the front-end can play directly.
+    The multipart `signal` and `ir` parts are decoded while the body streams in
+    (up to UPLOAD_MAX_BYTES). The decoded signal stays in memory and is passed
+    to the job; only `retain=true` writes it to disk, keeping it for later
+    calls without a signal.
+    If `signal` is omitted, falls back to the retained upload or the WAV recorded via /api/record/stop.
+    If `ir` is omitted, uses `ir_id` from the IR store or the selected IR.
+    Results are cached by the content of the signal and IR, `gain`, the method
+    and the config: a repeated request returns at once with `cached: true`,
+    and one matching a job still running joins that job. The output is a
+    RELATIVE URL (/api/results/{result_id}) that the front-end can play directly.
+    With `stream=true` the signal is processed block by block (bounded memory).
+    The work runs in the job pool; with `wait=false` the job ID is returned
+    immediately (HTTP 202) and the result is fetched from /api/jobs/{job_id}.
     """
-    global last_uploaded_signal
+    global latest_result
 
-    # -------- Locate signal WAV --------
+    parts = await uploads.receive(request, to_file=("signal",) if retain else ())
+    signal, ir = _part(parts, "signal"), _part(parts, "ir")
+
+    # -------- Locate signal WAV (referenced until the job ends), or keep it in memory --------
     if signal is None:
         if last_uploaded_signal is None:
             raise HTTPException(400, "No signal uploaded or recorded.")
-        signal_path = last_uploaded_signal
+        signal_path = Path(storage.acquire(last_uploaded_signal))
+    elif retain:
+        signal_path = Path(signal.path)   # the upload already holds a reference
+        _retain_signal(signal_path)
     else:
-        signal_path = UPLOAD_DIR / f"signal_{uuid4().hex}.wav"
-        with signal_path.open("wb") as f:
-            shutil.copyfileobj(signal.file, f)
-        last_uploaded_signal = signal_path
+        signal_path = None
 
-    sig_data, _ = sf.read(signal_path)
+    # -------- Locate IR (content-addressed store), look up the result cache, deconvolve + SAVE (job pool) --------
+    submitted = False
+    try:
+        ir_id = _resolve_ir(ir, ir_id)
+        if signal is not None:
+            digest, fs = signal.digest, signal.fs
+        else:
+            digest, fs = await run_in_threadpool(audio_io.file_digest, signal_path), sf.info(str(signal_path)).samplerate
+        key = results.result_key(digest, fs, ir_id, gain, stream)
+
+        cached = results.lookup(key) is not None
+        joined = not cached and key in pending_results
+        metrics.inc("result_cache_total", result="hit" if cached else "pending" if joined else "miss",
+                    help="Deconvolution requests by result cache outcome.")
+        if cached:
+            latest_result = key
+            return {"status": "done", "output_file": f"/api/results/{key}", "result_id": key,
+                    "job_id": None, "cached": True}
+
+        job_id = pending_results.get(key)
+        if job_id is None:
+            job_id = uuid4().hex
+            ir_pre = ir_store.load_preprocessed(ir_id)
+            tmp_path = jobs.scratch_path(results.result_path(key), job_id)
+            jobs.submit(
+                jobs.deconvolve_job, signal_path and str(signal_path), results.result_path(key), gain,
+                ir_pre=ir_pre, stream=stream, ir_spectrum=partial(ir_store.spectrum, ir_id),
+                tmp_path=tmp_path, signal=None if signal_path else signal.read(), fs=fs,
+                job_id=job_id, hold=(tmp_path,)
+            )
+            pending_results[key] = job_id
+            _track_result(job_id, key)
+            submitted = True
+    except jobs.QueueFullError as e:
+        raise HTTPException(429, str(e))
+    finally:
+        if signal_path is not None and submitted:
+            jobs.on_done(job_id, partial(storage.release, signal_path))
+        elif signal_path is not None:
+            storage.release(signal_path)
+
+    if not wait:
+        return JSONResponse(status_code=202, content={"status": "queued", "job_id": job_id,
+                                                      "result_id": key, "cached": False})
 
-    # -------- Locate / preprocess IR --------
-    if ir is not None:
-        ir_path = UPLOAD_DIR / f"ir_{uuid4().hex}.wav"
-        with ir_path.open("wb") as f:
-            shutil.copyfileobj(ir.file, f)
-        ir_data, _ = sf.read(ir_path)
-        ir_pre = impulse_response.preprocess_ir(ir_data, config.FS)
-    elif preprocessed_ir is not None:
-        ir_pre = preprocessed_ir
-    else:
-        raise HTTPException(400, "No IR provided or preloaded.")
+    try:
+        job_result = await jobs.wait(job_id)
+    except CancelledError as e:
+        raise HTTPException(409, str(e))
+    except ValueError as e:
+        raise HTTPException(422, f"Deconvolution failed: {e}")   # e.g. an IR too resonant to stream
+    except Exception as e:
+        raise HTTPException(500, f"Deconvolution failed: {e}")
+    metrics.add_request_timings(job_result.get("metrics", {}))
 
-    # -------- Deconvolve + SAVE --------
-    recovered = offline_deconvolution.offline_deconvolve(sig_data, ir_pre, config.FS, gain=gain)
+    # Return RELATIVE path so the browser can fetch it
+    return {"status": "done", "output_file": f"/api/results/{key}", "result_id": key,
+            "job_id": job_id, "cached": False}
 
-    output_path = Path(config.RECOVERED_FILE)        # e.g. .../output/recovered_output.wav
-    offline_deconvolution.save_output_audio(recovered, config.FS, output_path)
+# ---------------------------------------------------------------------------
+#  IR  STORE
+# ---------------------------------------------------------------------------
+@app.post("/api/ir")
+async def register_ir(request: Request, select: bool = Query(default=True)):
+    """Adds an IR (multipart `ir` part) to the content-addressed store; identical uploads map to the same ID."""
+    global selected_ir_id
+    ir = _part(await uploads.receive(request, to_file=()), "ir")
+    if ir is None:
+        raise HTTPException(400, "No IR uploaded.")
+    meta = ir_store.register(ir.read(), ir.fs, name=ir.filename)
+    if select:
+        selected_ir_id = meta["ir_id"]
+    return meta
+
+@app.get("/api/ir")
+async def list_irs():
+    return {"irs": ir_store.list_irs(), "selected": selected_ir_id}
+
+@app.post("/api/ir/{ir_id}/select")
+async def select_ir(ir_id: str):
+    global selected_ir_id
+    try:
+        meta = ir_store.get_meta(ir_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+    selected_ir_id = ir_id
+    return meta
+
+@app.post("/api/deconvolve/batch")
+async def deconvolve_batch(
+    request: Request,
+    ir_id:   Optional[str]     = Query(default=None),
+    gain:    float             = Query(default=1.0)
+):
+    """
+    Deconvolves several signals (multipart `signals` parts) against one IR in a single pass.
+    The IR is preprocessed and transformed once per FFT size. The batch runs as
+    one job in the job pool (HTTP 429 when the queue is full); results are
+    streamed back as newline-delimited JSON, one line per file as it is saved.
+    """
+    parts = await uploads.receive(request, to_file=())   # decoded into memory and passed to the job
+    signals = [p for p in parts if p.name == "signals"]
+    try:
+        if not signals:
+            raise HTTPException(400, "No signals uploaded.")
+        ir_id = _resolve_ir(_part(parts, "ir"), ir_id)
+        ir_pre = ir_store.load_preprocessed(ir_id)
+        batch_id = uuid4().hex
+        output_paths = [Path(config.OUTPUT_DIR) / f"recovered_batch_{batch_id}_{i}.wav" for i in range(len(signals))]
+        tmp_paths = [jobs.scratch_path(path, batch_id) for path in output_paths]
+        job_id = jobs.submit(
+            jobs.deconvolve_batch_job, [s.read() for s in signals], output_paths, ir_pre, gain,
+            ir_spectrum=partial(ir_store.spectrum, ir_id), tmp_paths=tmp_paths, job_id=batch_id,
+            hold=output_paths + tmp_paths
+        )
+    except jobs.QueueFullError as e:
+        raise HTTPException(429, str(e))
+
+    async def _lines():
+        remaining = dict(enumerate(output_paths))
+        while remaining:
+            finished = jobs.status(job_id)["status"] not in ("queued", "running", "cancelling")
+            for i, path in list(remaining.items()):
+                if path.exists():
+                    del remaining[i]
+                    line = {
+                        "index": i,
+                        "filename": signals[i].filename,
+                        "output_file": f"/output/{path.name}",
+                    }
+                    yield json.dumps(line) + "\n"
+            if remaining and finished:
+                info = jobs.status(job_id)
+                yield json.dumps({"error": f"Batch {info['status']}: {info.get('error', '')}".rstrip(": "),
+                                  "job_id": job_id}) + "\n"
+                return
+            if remaining:
+                await asyncio.sleep(config.BATCH_POLL_SECONDS)
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson", headers={"X-Job-Id": job_id})
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": jobs.list_jobs(), "queue_depth": jobs.queue_depth()}
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    try:
+        return jobs.status(job_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
 
-    # Return RELATIVE path so the browser can fetch it
-    relative_url = f"/output/{output_path.name}"
-    return {"status": "done", "output_file": relative_url}
+@app.get("/api/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    try:
+        info = jobs.status(job_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+    if info["status"] in ("queued", "running", "cancelling"):
+        return JSONResponse(status_code=202, content=info)
+    if info["status"] != "done":
+        raise HTTPException(409, f"Job {info['status']}: {info.get('error', '')}".rstrip(": "))
+    key = Path(jobs.result(job_id)["output_path"]).stem
+    return {"status": "done", "output_file": f"/api/results/{key}", "result_id": key, "job_id": job_id}
+
+@app.get("/api/results/{result_id}")
+def get_result(
+    result_id: str,
+    request: Request,
+    format: str = Query(default="wav"),
+    download: bool = Query(default=False)
+):
+    """
+    A cached result's recovered audio, encoded chunk by chunk: `wav` (float32),
+    `pcm16` (16-bit WAV, half the bytes) or `flac` (compressed). The WAV
+    formats honour a single HTTP Range for seeking; `flac` is sent whole.
+    """
+    if format not in results.FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(results.FORMATS)}.")
+    job_id = pending_results.get(result_id)
+    if job_id is not None:
+        info = jobs.status(job_id)
+        if info["status"] in ("queued", "running", "cancelling"):
+            return JSONResponse(status_code=202, content=info)
+    try:
+        src = results.open_result(result_id)
+    except KeyError:
+        raise HTTPException(404, f"No result '{result_id}'.")
 
-@app.post("/api/record/stop")
+    ext = "flac" if format == "flac" else "wav"
+    headers = {"Content-Disposition": f'{"attachment" if download else "inline"}; filename="recovered_{result_id[:12]}.{ext}"'}
+    if format == "flac":
+        headers["Accept-Ranges"] = "none"
+        return StreamingResponse(results.iter_flac(src), media_type=results.MEDIA_TYPES[format], headers=headers)
+
+    size = results.wav_size(format, src.frames, src.channels)
+    try:
+        byte_range = results.parse_range(request.headers.get("range"), size)
+    except ValueError:
+        src.close()
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    first, last = byte_range or (0, size - 1)
+    headers["Accept-Ranges"] = "bytes"
+    headers["Content-Length"] = str(last - first + 1)
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    return StreamingResponse(results.iter_wav(src, format, first, last), status_code=206 if byte_range else 200,
+                             media_type=results.MEDIA_TYPES[format], headers=headers)
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancels a job. A queued job is dropped at once ("cancelled"). A running job
+    cannot be interrupted in its worker: it is reported as "cancelling", runs
+    to completion, and its result is then discarded.
+    """
+    try:
+        state = jobs.cancel(job_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+    info = {"job_id": job_id, "status": state}
+    if state == "cancelling":
+        info["detail"] = "Job is already running; it will finish in its worker and the result will be discarded."
+    return info
+
+@app.post("/api/record/stop", dependencies=[Depends(_require_audio)])
 def stop_recording():
     global recorder
     if recorder is None:
         return {"status": "error", "message": "No recording in progress."}
 
-    sd.wait()
+    devices.sounddevice().wait()
     recorded_data = recorder
     recorder = None
 
@@ -163,9 +491,7 @@ def stop_recording():
 
     output_path = Path("output") / "speech_recorded.wav"
     sf.write(output_path, recorded_data, config.FS)
-    
-    global last_uploaded_signal
-    last_uploaded_signal = output_path
+    _retain_signal(output_path)
 
     return {
         "status": "recorded",
@@ -173,8 +499,8 @@ def stop_recording():
     }
 
 @app.get("/api/plot/offline")
-async def plot_offline():
-    sig, fs = sf.read(config.RECOVERED_FILE)
+def plot_offline():
+    sig, fs = _recovered()
     time_path = plotting.plot_time(sig, fs, "Recovered Signal (Time Domain)", filename="plot_time.png")
     freq_path = plotting.plot_freq(sig, fs, "Recovered Signal (Frequency Domain)", filename="plot_freq.png")
     return {
@@ -183,43 +509,218 @@ async def plot_offline():
         "freq_plot": freq_path
     }
 
-@app.post("/api/live/load-ir")
-async def load_ir_for_live(ir: UploadFile = File(...)):
-    ir_path = UPLOAD_DIR / f"live_ir_{uuid.uuid4().hex}.wav"
-    with ir_path.open("wb") as f:
-        shutil.copyfileobj(ir.file, f)
-    data, fs = sf.read(ir_path)
-    ir_pre = impulse_response.preprocess_ir(data, fs)
+@app.get("/api/plot/offline/data")
+def plot_offline_data(
+    kind: str = Query(default="time"),
+    width: int = Query(default=plotting.PLOT_WIDTH, ge=1, le=config.PLOT_DATA_MAX_WIDTH),
+    format: str = Query(default="json"),
+):
+    """
+    Decimated plot arrays for the recovered signal, drawn by the frontend itself.
+    `binary` returns little-endian float32 samples (min then max for `time`)
+    with the scalar fields in X-Plot-* headers.
+    """
+    if format not in ("json", "binary"):
+        raise HTTPException(400, "format must be 'json' or 'binary'.")
+    sig, fs = _recovered()
+    try:
+        data = plotting.plot_data(sig, fs, kind, width)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    arrays = {k: v for k, v in data.items() if isinstance(v, np.ndarray)}
+    scalars = {k: v for k, v in data.items() if k not in arrays}
+
+    if format == "binary":
+        body = b"".join(a.astype("<f4").tobytes() for a in arrays.values())
+        headers = {f"X-Plot-{k.replace('_', '-').title()}": str(v) for k, v in scalars.items()}
+        headers["X-Plot-Points"] = str(len(next(iter(arrays.values()))))
+        return Response(content=body, media_type="application/octet-stream", headers=headers)
+
+    # Four decimals are plenty at screen resolution and keep the JSON small
+    scalars.update({k: np.round(a.astype(np.float64), 4).tolist() for k, a in arrays.items()})
+    return scalars
+
+# ---------------------------------------------------------------------------
+#  SPECTROGRAM  PYRAMIDS
+# ---------------------------------------------------------------------------
+def _spectrogram_bytes(values: np.ndarray, fields: dict) -> Response:
+    headers = {f"X-Spec-{k.replace('_', '-').title()}": str(v) for k, v in fields.items()}
+    return Response(content=values.astype("<f4").tobytes(), media_type="application/octet-stream", headers=headers)
+
+@app.post("/api/spectrogram")
+def build_spectrogram(source: str = Query(default="recovered"), ir_id: Optional[str] = Query(default=None)):
+    """
+    Computes (once) the STFT pyramid of `recovered` (the latest job result),
+    `signal` (the last uploaded/recorded signal) or `ir` (`ir_id` or the selected IR).
+    """
+    if source == "recovered":
+        path = Path(_recovered_path())
+    elif source == "signal":
+        path = last_uploaded_signal
+    elif source == "ir":
+        ir_id = ir_id or selected_ir_id
+        try:
+            meta = ir_store.get_meta(ir_id)
+        except KeyError as e:
+            raise HTTPException(404, str(e))
+        return spectrogram.build(ir_store.load_raw(ir_id), meta["fs"], spectrogram.ir_key(ir_id), name=meta["name"])
+    else:
+        raise HTTPException(400, "source must be 'recovered', 'signal' or 'ir'.")
+    if path is None or not Path(path).exists():
+        raise HTTPException(404, f"No {source} audio available.")
+    return spectrogram.build_file(path)
+
+@app.get("/api/spectrogram")
+def list_spectrograms():
+    return {"spectrograms": spectrogram.list_pyramids()}
+
+@app.get("/api/spectrogram/{spectrogram_id}")
+def get_spectrogram(spectrogram_id: str):
     try:
-        live_deconvolution.start_live_deconv(ir_pre, fs)
-        return {"status": "live started"}
+        return spectrogram.get_meta(spectrogram_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+
+@app.get("/api/spectrogram/{spectrogram_id}/view")
+def spectrogram_view(
+    spectrogram_id: str,
+    t0: float = 0.0, t1: Optional[float] = None,
+    f0: float = 0.0, f1: Optional[float] = None,
+    level: Optional[int] = None,
+    width: int = Query(default=config.SPEC_DEFAULT_WIDTH, ge=1),
+    format: str = Query(default="binary"),
+):
+    """
+    dB values over a time (s) / frequency (Hz) range, as frames x bins float32
+    (row-major, fields in X-Spec-* headers) or JSON with `format=json`.
+    Without `level`, picks the coarsest level giving `width` frames over the range.
+    """
+    try:
+        view = spectrogram.query(spectrogram_id, t0, t1, f0, f1, level, width)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    values = view.pop("db")
+    if format == "json":
+        view["db"] = np.round(values.astype(np.float64), 2).tolist()
+        return view
+    return _spectrogram_bytes(values, view)
+
+@app.get("/api/spectrogram/{spectrogram_id}/tile/{level}/{tx}/{fy}")
+def spectrogram_tile(spectrogram_id: str, level: int, tx: int, fy: int):
+    """One SPEC_TILE x SPEC_TILE tile (frames x bins, float32 dB) of a pyramid level."""
+    try:
+        if level < 0:
+            raise IndexError(level)
+        info = spectrogram.get_meta(spectrogram_id)["levels"][level]
+    except (KeyError, IndexError):
+        raise HTTPException(404, "Unknown spectrogram or level.")
+    T = config.SPEC_TILE
+    if not (0 <= tx * T < info["frames"] and 0 <= fy * T < info["bins"]):
+        raise HTTPException(404, "Tile out of range.")
+    values = spectrogram.tile(spectrogram_id, level, tx, fy)
+    return _spectrogram_bytes(values, {"frames": values.shape[0], "bins": values.shape[1]})
+
+def _live_session(session: str, create: bool = False):
+    try:
+        return live_deconvolution.get_session(session, create=create)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+
+@app.post("/api/live/sessions")
+async def create_live_session(
+    session:        Optional[str] = Query(default=None),
+    input_device:   Optional[str] = Query(default=None),
+    output_device:  Optional[str] = Query(default=None),
+    input_channel:  int           = Query(default=0, ge=0),
+    output_channel: int           = Query(default=0, ge=0),
+    samplerate:     Optional[int] = Query(default=None, ge=1)
+):
+    # sounddevice takes either a device index or a name substring
+    as_device = lambda d: int(d) if d is not None and d.isdigit() else d
+    try:
+        s = live_deconvolution.create_session(
+            session, as_device(input_device), as_device(output_device), input_channel, output_channel,
+            samplerate
+        )
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    return s.status()
+
+@app.get("/api/live/sessions")
+async def list_live_sessions():
+    return {"sessions": live_deconvolution.list_sessions()}
+
+@app.delete("/api/live/sessions/{session_id}")
+async def delete_live_session(session_id: str):
+    try:
+        live_deconvolution.remove_session(session_id)
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+    return {"status": "removed", "session_id": session_id}
+
+@app.post("/api/live/load-ir", dependencies=[Depends(_require_audio)])
+async def load_ir_for_live(
+    request: Request,
+    ir_id: Optional[str] = Query(default=None),
+    session: str = Query(default=live_deconvolution.DEFAULT_SESSION)
+):
+    live = _live_session(session, create=session == live_deconvolution.DEFAULT_SESSION)
+    ir_id = _resolve_ir(_part(await uploads.receive(request, to_file=()), "ir"), ir_id)
+    ir_pre = ir_store.load_preprocessed(ir_id)
+    fs = ir_store.get_meta(ir_id)["fs"]
+    try:
+        live.start(ir_pre, fs)
+        return {"status": "live started", "session_id": live.session_id}
     except Exception as e:
         return {"status": "failed", "reason": str(e)}
 
-@app.post("/api/live/start")
-async def start_live():
-    if live_deconvolution._stream["inverse_fir"] is not None:
-        return {"status": "already running or IR loaded"}
-    return {"status": "IR not loaded, please upload via /live/load-ir first"}
+@app.post("/api/live/start", dependencies=[Depends(_require_audio)])
+async def start_live(session: str = Query(default=live_deconvolution.DEFAULT_SESSION)):
+    live = _live_session(session, create=session == live_deconvolution.DEFAULT_SESSION)
+    if live.running:
+        return {"status": "already running", "session_id": live.session_id}
+    if live.inverse_fir is None:
+        return {"status": "IR not loaded, please upload via /live/load-ir first"}
+    try:
+        live.start()
+        return {"status": "live started", "session_id": live.session_id}
+    except Exception as e:
+        return {"status": "failed", "reason": str(e)}
 
 @app.post("/api/live/stop")
-async def stop_live():
+async def stop_live(session: str = Query(default=live_deconvolution.DEFAULT_SESSION)):
     try:
-        live_deconvolution.stop_live_deconv()
-        return {"status": "stopped"}
+        live_deconvolution.stop_live_deconv(session)
+        return {"status": "stopped", "session_id": session}
     except Exception as e:
         return {"status": "error", "reason": str(e)}
 
 @app.get("/api/live/status")
-async def live_status():
-    return {"running": live_deconvolution._stream["input"] is not None}
+async def live_status(session: str = Query(default=live_deconvolution.DEFAULT_SESSION)):
+    try:
+        return live_deconvolution.get_session(session).status()
+    except KeyError:
+        return {"session_id": session, "running": False}
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage timings, job and live-callback counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/devices")
+def list_devices():
+    """Audio device availability; "unavailable" when headless or PortAudio cannot be loaded."""
+    return devices.status()
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "headless": config.HEADLESS, "startup_seconds": startup_times}
 
 @app.post("/api/clear-temp")
-async def clear_temp():
-    for f in UPLOAD_DIR.glob("*"):
-        f.unlink()
-    return {"status": "temp files cleared"}
+def clear_temp():
+    """Deletes every scratch upload, batch output and plot not in use by a job or the retained signal."""
+    return {"status": "temp files cleared", **storage.sweep(force=True)}
+
+startup_times["import"] = time.perf_counter() - _import_started
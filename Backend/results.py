@@ -0,0 +1,222 @@
+# noise_cleanse/results.py
+
+"""
+Deconvolution results: a content-addressed cache and HTTP delivery.
+
+A result is keyed by the content hashes of its signal and IR, the gain, the
+method and every config parameter the pipeline reads, so resubmitting the
+same inputs reuses the earlier output. The recovered audio is written once,
+as float32 WAV, to RESULTS_DIR/<key>.wav; that directory is the disk tier,
+kept under RESULT_CACHE_DISK_BYTES (LRU). Results being served are also kept
+in memory (LRU by bytes) so replays and plot refreshes skip the disk.
+
+Delivery encodes on the fly: `wav` (float32) and `pcm16` have a size known
+up front, so a byte range maps to a frame range and Range requests read only
+those frames; `flac` is encoded in a single streamed pass and is served
+without ranges.
+"""
+
+import os
+import re
+
+import numpy as np
+import soundfile as sf
+
+from . import config, fft_engine, metrics
+from .audio_io import AudioSource
+from .cache import ArrayCache, FileCache, content_key
+
+FORMATS = ("wav", "pcm16", "flac")
+MEDIA_TYPES = {"wav": "audio/wav", "pcm16": "audio/wav", "flac": "audio/flac"}
+
+# Config parameters that change the recovered audio
+_KEY_PARAMS = (
+    "FS", "IR_HIGH_PASS", "IR_LOW_PASS", "IMPULSE_LENGTH", "NOTCH_THRESHOLD", "NOTCH_WELCH_NPERSEG",
+    "GATING_NOISE_FRAMES", "GATING_NOISE_UPDATE", "STREAM_BLOCK_SIZE", "STREAM_INVERSE_TAPS",
+    "STREAM_INVERSE_MAX_TAPS", "STREAM_INVERSE_TOLERANCE", "OUTPUT_SUBTYPE",
+)
+
+_WAV_HEADER_BYTES = 44
+_SAMPLE = {"wav": (3, np.dtype("<f4")), "pcm16": (1, np.dtype("<i2"))}   # WAV format tag, sample type
+_ID_PATTERN = re.compile(r"[0-9a-f]{40}")
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+_files = FileCache(config.RESULTS_DIR, config.RESULT_CACHE_DISK_BYTES, ".wav")
+_memory = ArrayCache(config.RESULT_CACHE_MEMORY_ENTRIES, max_bytes=config.RESULT_CACHE_MEMORY_BYTES)
+
+
+def result_key(signal_digest: str, fs: int, ir_id: str, gain: float, stream: bool) -> str:
+    """Cache key of deconvolving the signal with sample digest `signal_digest` by IR `ir_id`."""
+    params = [getattr(config, name) for name in _KEY_PARAMS]
+    method = "stream" if stream else "offline"
+    return content_key("result", signal_digest, int(fs), ir_id, float(gain), method,
+                       fft_engine.real_dtype().name, *params)
+
+
+def result_path(key: str) -> str:
+    if not _ID_PATTERN.fullmatch(key or ""):
+        raise KeyError(f"Unknown result '{key}'.")
+    return _files.path(key)
+
+
+def lookup(key: str):
+    """Path of the cached result for `key` (marking it recently used), or None."""
+    result_path(key)
+    return _files.get(key)
+
+
+def commit(key: str):
+    """Adopt a result just written to `result_path(key)`, evicting old ones beyond the budget."""
+    if os.path.exists(result_path(key)):
+        _files.commit(key)
+
+
+def open_result(key: str) -> AudioSource:
+    """
+    The result as an AudioSource, from memory if recently served. Results that
+    fit the memory budget are loaded whole; larger ones are memory-mapped.
+    Raises KeyError if the result is not cached.
+    """
+    path = _files.get(key) if _ID_PATTERN.fullmatch(key or "") else None
+    if path is None:
+        raise KeyError(f"Unknown result '{key}'.")
+    with AudioSource(path) as src:
+        fs, nbytes = src.fs, src.frames * src.channels * 4
+    if nbytes > _memory.max_bytes // 4:
+        return AudioSource(path)
+
+    def load():
+        with AudioSource(path) as src:
+            return np.array(src.read())
+    return AudioSource.from_array(_memory.get_or_compute(key, load), fs)
+
+
+@metrics.register_collector
+def _collect_result_cache():
+    tiers = {"memory": _memory.stats(), "disk": _files.stats()}
+    return [
+        ("result_cache_entries", "gauge", "Cached deconvolution results per tier.",
+         [({"tier": tier}, s["entries"]) for tier, s in tiers.items()]),
+        ("result_cache_bytes", "gauge", "Bytes held by the result cache per tier.",
+         [({"tier": tier}, s["bytes"]) for tier, s in tiers.items()]),
+    ]
+
+
+def wav_size(fmt: str, frames: int, channels: int) -> int:
+    return _WAV_HEADER_BYTES + frames * channels * _SAMPLE[fmt][1].itemsize
+
+
+def wav_header(fmt: str, fs: int, frames: int, channels: int) -> bytes:
+    """Canonical 44-byte header for `frames` frames of `fmt` ("wav" float32 or "pcm16")."""
+    tag, dtype = _SAMPLE[fmt]
+    block = channels * dtype.itemsize
+    data = frames * block
+    return b"".join([
+        b"RIFF", (36 + data).to_bytes(4, "little"), b"WAVE",
+        b"fmt ", (16).to_bytes(4, "little"),
+        np.array([tag, channels], "<u2").tobytes(),
+        np.array([fs, fs * block], "<u4").tobytes(),
+        np.array([block, 8 * dtype.itemsize], "<u2").tobytes(),
+        b"data", data.to_bytes(4, "little"),
+    ])
+
+
+def parse_range(header: str, size: int):
+    """(first, last) byte of a single `bytes=` range, None if absent; ValueError if unsatisfiable."""
+    if not header:
+        return None
+    match = _RANGE_PATTERN.fullmatch(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None   # unsupported (e.g. multiple ranges): serve the whole body
+    first, last = match.groups()
+    if first == "":
+        first, last = max(0, size - int(last)), size - 1
+    else:
+        first, last = int(first), min(int(last) if last else size - 1, size - 1)
+    if first > last or first >= size:
+        raise ValueError(f"Range not satisfiable for {size} bytes.")
+    return first, last
+
+
+def _encode(block: np.ndarray, dtype: np.dtype) -> bytes:
+    if dtype.kind == "i":
+        block = np.clip(np.round(block * 32768.0), -32768, 32767)
+    return block.astype(dtype).tobytes()
+
+
+def iter_wav(src: AudioSource, fmt: str, first: int = 0, last: int = None, chunk: int = config.AUDIO_CHUNK):
+    """Bytes first..last (inclusive) of `src` encoded as `fmt`, generated chunk by chunk; closes `src`."""
+    with src:
+        size = wav_size(fmt, src.frames, src.channels)
+        last = size - 1 if last is None else last
+        if first < _WAV_HEADER_BYTES:
+            yield wav_header(fmt, src.fs, src.frames, src.channels)[first:last + 1]
+        frame_bytes = src.channels * _SAMPLE[fmt][1].itemsize
+        lo = max(first, _WAV_HEADER_BYTES) - _WAV_HEADER_BYTES
+        hi = last + 1 - _WAV_HEADER_BYTES
+        for start in range(lo // frame_bytes * frame_bytes, hi, chunk * frame_bytes):
+            frame = start // frame_bytes
+            data = _encode(src.read(frame, frame + chunk), _SAMPLE[fmt][1])
+            yield data[max(0, lo - start):hi - start]
+
+
+class _StreamSink:
+    """Write-only file object for soundfile: bytes are handed out with `take` and then
+    forgotten, so writes that seek back into them (header updates on close) are dropped."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._base = 0   # stream offset of _buf[0]
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        n = len(data)
+        offset = self._pos - self._base
+        if offset < 0:
+            data, offset = data[-offset:], 0
+        end = offset + len(data)
+        if end > len(self._buf):
+            self._buf.extend(bytes(end - len(self._buf)))
+        self._buf[offset:end] = data
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = {0: 0, 1: self._pos, 2: self._base + len(self._buf)}[whence]
+        self._pos = base + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    def take(self) -> bytes:
+        out = bytes(self._buf)
+        self._base += len(out)
+        self._buf = bytearray()
+        return out
+
+
+def iter_flac(src: AudioSource, chunk: int = config.AUDIO_CHUNK):
+    """`src` as 16-bit FLAC, encoded and yielded chunk by chunk; closes `src`."""
+    sink = _StreamSink()
+    with src:
+        with sf.SoundFile(sink, "w", samplerate=src.fs, channels=src.channels,
+                          format="FLAC", subtype="PCM_16") as out:
+            first = True
+            for block in src.chunks(chunk):
+                out.write(block)
+                data = sink.take()
+                if first and len(data) >= 26:
+                    # STREAMINFO total samples (36 bits at byte 21) is only filled in on
+                    # close, after the header has been sent; the frame count is known now
+                    data = bytearray(data)
+                    data[21] = (data[21] & 0xF0) | (src.frames >> 32 & 0x0F)
+                    data[22:26] = (src.frames & 0xFFFFFFFF).to_bytes(4, "big")
+                    data, first = bytes(data), False
+                if data:
+                    yield data
+        yield sink.take()
@@ -0,0 +1,236 @@
+# noise_cleanse/spectral_gating.py
+
+"""
+Spectral gating engine.
+
+`gate_signal` analyses a signal once and composes the multi-pass gating masks
+in place on that single STFT. `SpectralGate` is the frame-by-frame streaming
+counterpart with bounded memory, for long files and the live path.
+"""
+
+import numpy as np
+
+from . import config, fft_engine
+
+WIN_SIZE = 512
+HOP = WIN_SIZE // 2
+NOISE_BINS = 50          # Top frequency bins used to estimate the noise floor
+THRESHOLD_FACTOR = 1.5   # Bins below factor * noise floor are gated
+ATTENUATION = 0.1        # Gain applied to gated bins
+
+
+def _roundtrip_gain(fs: int, window: np.ndarray) -> float:
+    """Amplitude change of one spectrogram(mode='complex') -> istft round trip."""
+    return np.sum(window) * np.sqrt(1.0 / (fs * np.sum(window**2)))
+
+
+def gate_signal(signal: np.ndarray, fs: int, passes: int = 2) -> np.ndarray:
+    """
+    Multi-pass spectral gating from a single STFT.
+
+    Pass k masks the frames the k-th resynthesis/reanalysis would have kept,
+    using the noise floor of the already-gated magnitudes, so the result tracks
+    the original pass-by-pass implementation (identical for one pass).
+    """
+    from scipy.signal import spectrogram, istft
+
+    dtype = fft_engine.real_dtype()
+    window = np.hamming(WIN_SIZE).astype(dtype)
+    signal = np.asarray(signal, dtype=dtype)
+    if len(signal) < WIN_SIZE:
+        signal = np.pad(signal, (0, WIN_SIZE - len(signal)))
+    _, _, S = spectrogram(signal, fs, window=window, nperseg=WIN_SIZE, noverlap=HOP, mode='complex')
+
+    n_frames = S.shape[1]
+    passes = max(1, min(passes, (n_frames + 1) // 2))
+    mag = np.empty(S.shape, dtype=dtype)
+    mask = np.empty(S.shape, dtype=bool)
+    for k in range(passes):
+        cols = slice(k, n_frames - k)
+        S_k, mag_k, mask_k = S[:, cols], mag[:, cols], mask[:, cols]
+        np.abs(S_k, out=mag_k)
+        threshold = THRESHOLD_FACTOR * np.median(mag_k[-NOISE_BINS:, :])
+        np.less(mag_k, threshold, out=mask_k)
+        mag_k.fill(1.0)
+        np.copyto(mag_k, ATTENUATION, where=mask_k)
+        S_k *= mag_k
+
+    cols = slice(passes - 1, n_frames - (passes - 1))
+    _, out = istft(S[:, cols], fs, window=window, nperseg=WIN_SIZE, noverlap=HOP)
+    out *= _roundtrip_gain(fs, window) ** (passes - 1)
+    return out
+
+
+class SpectralGate:
+    """
+    Streaming spectral gate: 512-sample Hamming frames, 50% overlap.
+
+    The noise floor of each pass is the median over the last `noise_frames`
+    frames (re-estimated every `noise_update` frames), so memory stays bounded.
+    `process` returns samples as frames complete; `process_block` returns
+    exactly len(block) samples with a constant one-hop latency, for realtime use.
+    Frame state lives in preallocated buffers updated in place; besides the
+    transforms themselves, `process_block` allocates nothing once warmed up.
+    """
+
+    def __init__(self, fs: int, passes: int = 2, noise_frames: int = config.GATING_NOISE_FRAMES,
+                 noise_update: int = config.GATING_NOISE_UPDATE, gain: float = 1.0,
+                 block_size: int = config.LIVE_FRAME_SIZE):
+        self.fs = fs
+        self.passes = passes
+        self.gain = float(gain)   # a Python float keeps float32 frames float32
+        self.noise_update = max(1, noise_update)
+        dtype = fft_engine.real_dtype()
+        self.window = np.hamming(WIN_SIZE).astype(dtype)
+        self._win_sq = self.window**2
+
+        bins = WIN_SIZE // 2 + 1
+        self._frame = np.zeros(WIN_SIZE, dtype=dtype)
+        self._fill = 0
+        self._seg = np.empty(WIN_SIZE, dtype=dtype)
+        self._mag = np.empty(bins, dtype=dtype)
+        self._gains = np.empty(bins, dtype=dtype)
+        self._mask = np.empty(bins, dtype=bool)
+        self._valid = np.empty(HOP, dtype=bool)
+        self._ola = np.zeros(WIN_SIZE, dtype=dtype)
+        self._norm = np.zeros(WIN_SIZE, dtype=dtype)
+        self._noise = np.zeros((passes, noise_frames, NOISE_BINS), dtype=dtype)
+        self._noise_count = 0
+        self._floors = np.zeros(passes)
+        self._frames = 0
+
+        # process_block output FIFO: starts with one hop of silence (the latency)
+        self._fifo = np.zeros(block_size + HOP, dtype=dtype)
+        self._fifo_len = HOP
+        self._block_out = np.empty(block_size, dtype=dtype)
+
+    def _process_frame(self, out: np.ndarray):
+        """Gate the full frame buffer and write the next HOP output samples into `out`."""
+        np.subtract(self._frame, np.mean(self._frame), out=self._seg)
+        self._seg *= self.window
+        S = fft_engine.rfft(self._seg)
+        mag = np.abs(S, out=self._mag)
+
+        slot = self._frames % self._noise.shape[1]
+        self._noise_count = min(self._noise_count + 1, self._noise.shape[1])
+        refresh = self._frames % self.noise_update == 0
+        for k in range(self.passes):
+            self._noise[k, slot] = mag[-NOISE_BINS:]
+            if refresh:
+                self._floors[k] = np.median(self._noise[k, :self._noise_count])
+            np.less(mag, THRESHOLD_FACTOR * self._floors[k], out=self._mask)
+            self._gains.fill(1.0)
+            np.copyto(self._gains, ATTENUATION, where=self._mask)
+            S *= self._gains
+            mag *= self._gains
+        self._frames += 1
+
+        y = fft_engine.irfft(S, WIN_SIZE)
+        y *= self.window
+        self._ola += y
+        self._norm += self._win_sq
+        np.greater(self._norm[:HOP], 1e-10, out=self._valid)
+        out[:] = self._ola[:HOP]
+        np.divide(self._ola[:HOP], self._norm[:HOP], out=out, where=self._valid)
+        out *= self.gain
+
+        self._ola[:HOP] = self._ola[HOP:]
+        self._ola[HOP:] = 0.0
+        self._norm[:HOP] = self._norm[HOP:]
+        self._norm[HOP:] = 0.0
+        self._frame[:HOP] = self._frame[HOP:]
+        self._fill = HOP
+
+    def _feed(self, block: np.ndarray, emit):
+        """Copy `block` into the frame buffer, calling emit() for each completed frame."""
+        pos = 0
+        while pos < len(block):
+            take = min(WIN_SIZE - self._fill, len(block) - pos)
+            self._frame[self._fill:self._fill + take] = block[pos:pos + take]
+            self._fill += take
+            pos += take
+            if self._fill == WIN_SIZE:
+                emit()
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Feed a block of any length; returns the output samples completed so far."""
+        outputs = []
+
+        def emit():
+            outputs.append(np.empty(HOP, dtype=self._frame.dtype))
+            self._process_frame(outputs[-1])
+
+        self._feed(block, emit)
+        return np.concatenate(outputs) if outputs else np.zeros(0, dtype=self._frame.dtype)
+
+    def _emit_to_fifo(self):
+        self._process_frame(self._fifo[self._fifo_len:self._fifo_len + HOP])
+        self._fifo_len += HOP
+
+    def process_block(self, block: np.ndarray) -> np.ndarray:
+        """
+        Gate a block whose length is a multiple of the hop, returning as many
+        samples. The result is a view of an internal buffer, valid until the next call.
+        """
+        n = len(block)
+        if n + HOP > len(self._fifo):   # larger block than configured: grow once
+            fifo = np.zeros(n + HOP, dtype=self._fifo.dtype)
+            fifo[:self._fifo_len] = self._fifo[:self._fifo_len]
+            self._fifo, self._block_out = fifo, np.empty(n, dtype=self._fifo.dtype)
+
+        self._feed(block, self._emit_to_fifo)
+        out = self._block_out[:n]
+        out[:] = self._fifo[:n]
+        rest = self._fifo_len - n
+        self._fifo[:rest] = self._fifo[n:self._fifo_len]
+        self._fifo_len = rest
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Drain the last partial frame (zero-padded)."""
+        if self._fill <= HOP:
+            return np.zeros(0, dtype=self._frame.dtype)
+        self._frame[self._fill:] = 0.0
+        self._fill = WIN_SIZE
+        out = np.empty(HOP, dtype=self._frame.dtype)
+        self._process_frame(out)
+        return out
+
+
+def gate_stream(blocks, fs: int, passes: int = 2):
+    """
+    Streaming counterpart of gate_signal: consumes an iterable of 1-D blocks and
+    yields gated blocks with the same alignment, gain and overall length.
+    """
+    window = np.hamming(WIN_SIZE).astype(fft_engine.real_dtype())
+    gate = SpectralGate(fs, passes, gain=_roundtrip_gain(fs, window) ** passes)
+
+    # gate_signal's output starts `passes` hops into the input; the final
+    # length is only known at the end, so a few hops are held back.
+    skip = passes * HOP
+    holdback = (passes + 1) * HOP
+    tail = np.zeros(0, dtype=fft_engine.real_dtype())
+    total_in = 0
+    emitted = 0
+
+    for block in blocks:
+        block = np.asarray(block, dtype=fft_engine.real_dtype())
+        if block.ndim > 1:
+            block = block[:, 0]
+        total_in += len(block)
+        y = gate.process(block)
+        if skip:
+            dropped = min(skip, len(y))
+            y = y[dropped:]
+            skip -= dropped
+        tail = np.concatenate((tail, y))
+        if len(tail) > holdback:
+            emitted += len(tail) - holdback
+            yield tail[:-holdback]
+            tail = tail[-holdback:]
+
+    tail = np.concatenate((tail, gate.flush()[skip:]))
+    n_frames = 1 + (max(total_in, WIN_SIZE) - WIN_SIZE) // HOP
+    p = max(1, min(passes, (n_frames + 1) // 2))
+    target = (n_frames - 2 * p + 1) * HOP
+    yield tail[:max(0, target - emitted)]
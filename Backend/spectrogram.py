@@ -0,0 +1,319 @@
+# noise_cleanse/spectrogram.py
+
+"""
+Multi-resolution STFT pyramids for zoomable spectrogram views.
+
+A pyramid is computed once per audio source and stored as memory-mapped
+`.npy` power arrays, one per level. The finest level holds every STFT frame
+(SPEC_NFFT / SPEC_HOP); each coarser level averages 2 frames (and 2 bins while
+more than SPEC_MIN_BINS remain) of the next finer one. Level 0 is the coarsest.
+Tiles of SPEC_TILE x SPEC_TILE cells are served in dB from an in-memory LRU.
+Stored pyramids are kept under SPECTROGRAM_DIR_MAX_BYTES, least recently used
+first out, and a file's pyramid replaces the one built before it was rewritten.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from . import config, fft_engine, metrics
+from .audio_io import AudioSource
+from .cache import ArrayCache, content_key
+
+logger = logging.getLogger(__name__)
+
+_ID_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+_build_lock = threading.Lock()
+_tiles = ArrayCache(config.SPEC_TILE_CACHE_SIZE)
+_levels = OrderedDict()   # (pyramid_id, level) -> read-only memmap, least recently used first
+_levels_lock = threading.Lock()
+_used = {}   # pyramid_id -> last use in this process, newer than the directory's mtime
+
+_FRAME_CHUNK = 4096   # STFT frames transformed per batch while building
+
+
+def _pyramid_dir(pyramid_id: str) -> str:
+    if not _ID_PATTERN.fullmatch(pyramid_id or ""):
+        raise KeyError(f"Unknown spectrogram '{pyramid_id}'.")
+    return os.path.join(config.SPECTROGRAM_DIR, pyramid_id)
+
+
+def file_key(path) -> str:
+    """Pyramid ID for an audio file; changes whenever the file is rewritten."""
+    st = os.stat(path)
+    return content_key("file", os.path.realpath(path), st.st_size, st.st_mtime_ns,
+                       config.SPEC_NFFT, config.SPEC_HOP)
+
+
+def _source_key(path) -> str:
+    """Same for every version of a file, so a rewrite can replace the old pyramid."""
+    return content_key("source", os.path.realpath(path))
+
+
+def ir_key(ir_id: str) -> str:
+    """Pyramid ID for an IR in the IR store."""
+    return content_key("ir", ir_id, config.SPEC_NFFT, config.SPEC_HOP)
+
+
+def _stft_power(signal: np.ndarray, out: np.ndarray):
+    """Write |STFT|^2 (bins 0 .. nfft/2 - 1) of `signal` into `out`, frame chunk by chunk."""
+    nfft, hop = config.SPEC_NFFT, config.SPEC_HOP
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(nfft) / nfft)).astype(np.float32)   # periodic Hann
+    frames = np.lib.stride_tricks.sliding_window_view(signal, nfft)[::hop]
+    for start in range(0, len(out), _FRAME_CHUNK):
+        chunk = frames[start:start + _FRAME_CHUNK] * window
+        spec = fft_engine.rfft(chunk, axis=-1)[:, :nfft // 2]
+        out[start:start + len(chunk)] = spec.real ** 2 + spec.imag ** 2
+
+
+def _pool(src: np.ndarray, out: np.ndarray, halve_bins: bool):
+    """Average pairs of frames (and bins) of `src` into `out`; an odd last frame is copied."""
+    pairs = len(src) // 2
+    step = 2 * _FRAME_CHUNK
+    for start in range(0, 2 * pairs, step):
+        block = np.asarray(src[start:min(start + step, 2 * pairs)])
+        block = 0.5 * (block[0::2] + block[1::2])
+        if halve_bins:
+            block = 0.5 * (block[:, 0::2] + block[:, 1::2])
+        out[start // 2:start // 2 + len(block)] = block
+    if len(src) % 2:
+        last = np.asarray(src[-1])
+        out[-1] = 0.5 * (last[0::2] + last[1::2]) if halve_bins else last
+
+
+@metrics.timed("build_spectrogram")
+def build(signal: np.ndarray, fs: int, pyramid_id: str, name: str = None, source: str = None) -> dict:
+    """
+    Compute and store the pyramid for `signal` unless `pyramid_id` already exists.
+    Other pyramids with the same `source` are deleted, then the least recently
+    used ones until the directory fits its budget.
+    """
+    with _build_lock:
+        try:
+            return get_meta(pyramid_id)
+        except KeyError:
+            pass
+
+        nfft, hop = config.SPEC_NFFT, config.SPEC_HOP
+        signal = np.asarray(signal, dtype=np.float32)
+        if signal.ndim > 1:
+            signal = signal[:, 0]
+        frames = 1 + -(-max(len(signal) - nfft, 0) // hop)
+        padded = np.zeros((frames - 1) * hop + nfft, dtype=np.float32)
+        padded[:len(signal)] = signal
+
+        final = _pyramid_dir(pyramid_id)
+        os.makedirs(config.SPECTROGRAM_DIR, exist_ok=True)
+        tmp = tempfile.mkdtemp(suffix=".tmp", dir=config.SPECTROGRAM_DIR)
+
+        # Finest level first, then halve until one tile covers the whole signal
+        shapes = [(frames, nfft // 2)]
+        while shapes[-1][0] > config.SPEC_TILE:
+            n, bins = shapes[-1]
+            shapes.append((-(-n // 2), bins // 2 if bins > config.SPEC_MIN_BINS else bins))
+        depth = len(shapes)
+
+        prev = None
+        for i, shape in enumerate(shapes):
+            level = depth - 1 - i
+            arr = np.lib.format.open_memmap(
+                os.path.join(tmp, f"level_{level}.npy"), mode="w+", dtype=np.float32, shape=shape
+            )
+            if prev is None:
+                _stft_power(padded, arr)
+            else:
+                _pool(prev, arr, shape[1] < prev.shape[1])
+            arr.flush()
+            prev = arr
+        del prev, arr
+
+        meta = {
+            "spectrogram_id": pyramid_id,
+            "name": name,
+            "source": source,
+            "fs": int(fs),
+            "duration": len(signal) / fs,
+            "nfft": nfft,
+            "hop": hop,
+            "tile": config.SPEC_TILE,
+            "created": time.time(),
+            "levels": [
+                {
+                    "level": depth - 1 - i,
+                    "frames": n,
+                    "bins": bins,
+                    "seconds_per_frame": hop * 2 ** i / fs,
+                    "hz_per_bin": fs / nfft * (nfft // 2) / bins,
+                }
+                for i, (n, bins) in enumerate(shapes)
+            ][::-1],
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        _used[pyramid_id] = time.time()
+        logger.info("Built %d-level spectrogram %s (%d frames).", depth, pyramid_id[:8], frames)
+
+        if source is not None:
+            for other in list_pyramids():
+                if other.get("source") == source and other["spectrogram_id"] != pyramid_id:
+                    _remove_locked(other["spectrogram_id"], "replaced")
+        _evict_locked(keep=pyramid_id)
+    return meta
+
+
+def _remove_locked(pyramid_id: str, reason: str):
+    with _levels_lock:
+        for key in [k for k in _levels if k[0] == pyramid_id]:
+            del _levels[key]
+    _used.pop(pyramid_id, None)
+    shutil.rmtree(_pyramid_dir(pyramid_id), ignore_errors=True)
+    metrics.inc("spectrogram_evictions_total", reason=reason, help="Stored spectrogram pyramids deleted.")
+
+
+def _evict_locked(keep: str):
+    """Delete least recently used pyramids (never `keep`) until SPECTROGRAM_DIR fits its budget."""
+    entries = []
+    for entry in os.scandir(config.SPECTROGRAM_DIR):
+        if entry.is_dir() and _ID_PATTERN.fullmatch(entry.name):
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((max(entry.stat().st_mtime, _used.get(entry.name, 0.0)), size, entry.name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, pyramid_id in sorted(entries):
+        if total <= config.SPECTROGRAM_DIR_MAX_BYTES:
+            break
+        if pyramid_id != keep:
+            _remove_locked(pyramid_id, "budget")
+            total -= size
+
+
+def build_file(path, name: str = None) -> dict:
+    """Pyramid for an audio file, reusing the stored one if the file is unchanged."""
+    pyramid_id = file_key(path)
+    try:
+        return get_meta(pyramid_id)
+    except KeyError:
+        pass
+    with AudioSource(path) as src:
+        return build(src.read(channel=0), src.fs, pyramid_id, name or os.path.basename(str(path)),
+                     source=_source_key(path))
+
+
+def _read_meta(pyramid_id: str) -> dict:
+    path = os.path.join(_pyramid_dir(pyramid_id), "meta.json")
+    if not os.path.exists(path):
+        raise KeyError(f"Unknown spectrogram '{pyramid_id}'.")
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_meta(pyramid_id: str) -> dict:
+    meta = _read_meta(pyramid_id)
+    _used[pyramid_id] = time.time()
+    return meta
+
+
+def _level(pyramid_id: str, level: int) -> np.ndarray:
+    key = (pyramid_id, level)
+    with _levels_lock:
+        arr = _levels.get(key)
+        if arr is not None:
+            _levels.move_to_end(key)
+    if arr is None:
+        path = os.path.join(_pyramid_dir(pyramid_id), f"level_{level}.npy")
+        if not os.path.exists(path):
+            raise KeyError(f"Spectrogram '{pyramid_id}' has no level {level}.")
+        arr = np.load(path, mmap_mode="r")
+        with _levels_lock:
+            _levels[key] = arr
+            while len(_levels) > config.SPEC_OPEN_LEVELS:
+                _levels.popitem(last=False)
+    _used[pyramid_id] = time.time()
+    return arr
+
+
+def tile(pyramid_id: str, level: int, tx: int, fy: int) -> np.ndarray:
+    """Tile (tx, fy) of `level` in dB: frames tx*SPEC_TILE.., bins fy*SPEC_TILE.."""
+    def compute():
+        arr = _level(pyramid_id, level)
+        t0, f0 = tx * config.SPEC_TILE, fy * config.SPEC_TILE
+        block = np.asarray(arr[t0:t0 + config.SPEC_TILE, f0:f0 + config.SPEC_TILE])
+        return (10 * np.log10(block + 1e-20)).astype(np.float32)
+    return _tiles.get_or_compute(content_key(pyramid_id, level, tx, fy), compute)
+
+
+def choose_level(meta: dict, t0: float, t1: float, width: int) -> int:
+    """Coarsest level with at least `width` frames between t0 and t1 (or the finest)."""
+    for info in meta["levels"]:
+        if (t1 - t0) / info["seconds_per_frame"] >= width:
+            return info["level"]
+    return meta["levels"][-1]["level"]
+
+
+def query(pyramid_id: str, t0: float = 0.0, t1: float = None, f0: float = 0.0, f1: float = None,
+          level: int = None, width: int = config.SPEC_DEFAULT_WIDTH) -> dict:
+    """
+    dB values covering [t0, t1) seconds and [f0, f1) Hz, stitched from cached tiles.
+    With no `level`, the coarsest one giving `width` frames over the range is used.
+    """
+    meta = get_meta(pyramid_id)
+    t1 = meta["duration"] if t1 is None else t1
+    f1 = meta["fs"] / 2 if f1 is None else f1
+    if not (t1 > t0 >= 0 and f1 > f0 >= 0):
+        raise ValueError("Expected 0 <= t0 < t1 and 0 <= f0 < f1.")
+    if level is None:
+        level = choose_level(meta, t0, t1, width)
+    if not 0 <= level < len(meta["levels"]):
+        raise ValueError(f"Level must be between 0 and {len(meta['levels']) - 1}.")
+    info = meta["levels"][level]
+
+    dt, df = info["seconds_per_frame"], info["hz_per_bin"]
+    i0 = min(int(t0 / dt), info["frames"] - 1)
+    i1 = max(i0 + 1, min(int(np.ceil(t1 / dt)), info["frames"]))
+    b0 = min(int(f0 / df), info["bins"] - 1)
+    b1 = max(b0 + 1, min(int(np.ceil(f1 / df)), info["bins"]))
+    if (i1 - i0) * (b1 - b0) > config.SPEC_MAX_CELLS:
+        raise ValueError("Requested range is too large at this level; use a coarser level.")
+
+    T = config.SPEC_TILE
+    out = np.empty((i1 - i0, b1 - b0), dtype=np.float32)
+    for tx in range(i0 // T, (i1 - 1) // T + 1):
+        for fy in range(b0 // T, (b1 - 1) // T + 1):
+            data = tile(pyramid_id, level, tx, fy)
+            r0, r1 = max(i0, tx * T), min(i1, tx * T + len(data))
+            c0, c1 = max(b0, fy * T), min(b1, fy * T + data.shape[1])
+            out[r0 - i0:r1 - i0, c0 - b0:c1 - b0] = data[r0 - tx * T:r1 - tx * T, c0 - fy * T:c1 - fy * T]
+
+    return {
+        "spectrogram_id": pyramid_id,
+        "level": level,
+        "t0": i0 * dt,
+        "dt": dt,
+        "f0": b0 * df,
+        "df": df,
+        "frames": i1 - i0,
+        "bins": b1 - b0,
+        "db": out,
+    }
+
+
+def list_pyramids() -> list:
+    if not os.path.isdir(config.SPECTROGRAM_DIR):
+        return []
+    metas = []
+    for pyramid_id in os.listdir(config.SPECTROGRAM_DIR):
+        try:
+            metas.append(_read_meta(pyramid_id))
+        except KeyError:
+            continue
+    return sorted(metas, key=lambda m: m["created"])
@@ -0,0 +1,205 @@
+# noise_cleanse/storage.py
+
+"""
+Housekeeping for the server's scratch directories.
+
+Each managed area (uploads, batch outputs, disk caches, plots) has a byte
+budget and a maximum age. A background sweeper deletes files past their age,
+then the least recently used ones until the area fits its budget. Files in
+use are reference-counted with `acquire`/`release` and are never deleted while
+referenced; jobs hold the files they write (see `jobs.submit`). `adopt` gives
+a finished file a content-derived name, so identical uploads share one file.
+
+The rest of OUTPUT_DIR bounds itself: results are a FileCache under
+RESULT_CACHE_DISK_BYTES, spectrogram pyramids are evicted by `spectrogram`
+under SPECTROGRAM_DIR_MAX_BYTES, and the IR store keeps only registered IRs
+(their spectra are cached in memory).
+"""
+
+import glob
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Area:
+    """Files under `directory` matching `patterns`, kept under `max_bytes` and `max_age` seconds."""
+
+    def __init__(self, name: str, directory: str, max_bytes: int, max_age: float, patterns=("*",)):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.patterns = patterns
+
+    def files(self) -> list:
+        paths = set()
+        for pattern in self.patterns:
+            paths.update(glob.glob(os.path.join(self.directory, pattern)))
+        return [p for p in paths if os.path.isfile(p)]
+
+
+AREAS = (
+    Area("uploads", config.UPLOAD_DIR, config.UPLOAD_DIR_MAX_BYTES, config.UPLOAD_MAX_AGE),
+    Area("output", config.OUTPUT_DIR, config.OUTPUT_SCRATCH_MAX_BYTES, config.OUTPUT_SCRATCH_MAX_AGE,
+         ("recovered_batch_*.wav", os.path.join("results", "*.tmp.wav"))),
+    Area("caches", config.OUTPUT_DIR, config.CACHE_DIR_MAX_BYTES, config.CACHE_MAX_AGE,
+         tuple(os.path.join(d, "*.npy") for d in (config.SWEEP_CACHE_DIR, config.INV_FIR_CACHE_DIR) if d)),
+    Area("plots", config.PLOT_DIR, config.PLOT_DIR_MAX_BYTES, config.PLOT_MAX_AGE),
+)
+
+_refs = Counter()   # path -> references held
+_used = {}          # path -> last acquire/release, newer than the mtime for files read in place
+_usage = {}         # area name -> (files, bytes) after the last sweep
+_lock = threading.Lock()
+
+_sweeper = None
+_stop = threading.Event()
+
+
+def _key(path) -> str:
+    return os.path.abspath(str(path))
+
+
+def acquire(path) -> str:
+    """Take a reference on `path`; it is not deleted until every reference is released."""
+    key = _key(path)
+    with _lock:
+        _refs[key] += 1
+        _used[key] = time.time()
+    return str(path)
+
+
+def release(path):
+    key = _key(path)
+    with _lock:
+        if _refs[key] > 1:
+            _refs[key] -= 1
+        else:
+            _refs.pop(key, None)
+        _used[key] = time.time()
+
+
+def in_use(path) -> bool:
+    with _lock:
+        return _refs.get(_key(path), 0) > 0
+
+
+def adopt(tmp_path: str, name: str) -> str:
+    """
+    Move the finished file `tmp_path` to `name` in the same directory and take a
+    reference on it. If a file of that name exists it has the same content:
+    `tmp_path` is deleted and the existing file is reused.
+    """
+    final = os.path.join(os.path.dirname(tmp_path), name)
+    key = _key(final)
+    with _lock:
+        if os.path.exists(final):
+            os.unlink(tmp_path)
+            metrics.inc("storage_dedup_total", help="Finished files replaced by an identical existing file.")
+        else:
+            os.replace(tmp_path, final)
+        _refs[key] += 1
+        _used[key] = time.time()
+    return final
+
+
+def sweep(force: bool = False) -> dict:
+    """
+    One pass over every area: delete unreferenced files older than the area's
+    max age, then the least recently used until it fits its budget. `force`
+    deletes every unreferenced file. Returns counts of removed and in-use files.
+    """
+    now = time.time()
+    removed, held, freed = 0, 0, 0
+    for area in AREAS:
+        entries = []
+        for path in area.files():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((max(st.st_mtime, _used.get(_key(path), 0.0)), st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+
+        for last, size, path in entries:
+            if force:
+                reason = "clear"
+            elif now - last > area.max_age:
+                reason = "age"
+            elif total > area.max_bytes:
+                reason = "budget"
+            else:
+                break   # the rest are newer and fit the budget
+            key = _key(path)
+            with _lock:
+                if _refs.get(key, 0) > 0:
+                    held += 1
+                    continue
+                if _used.get(key, 0.0) > last and not force:
+                    continue   # used since it was listed
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                _used.pop(key, None)
+            total -= size
+            count -= 1
+            removed += 1
+            freed += size
+            metrics.inc("storage_deleted_files_total", area=area.name, reason=reason,
+                        help="Scratch files deleted by the storage sweeper.")
+        _usage[area.name] = (count, total)
+
+    if removed:
+        logger.info("Storage sweep removed %d file(s), %.1f MB.", removed, freed / 1e6)
+    return {"removed": removed, "in_use": held, "freed_bytes": freed}
+
+
+def start_sweeper(interval: float = config.STORAGE_SWEEP_INTERVAL):
+    """Sweep now and then every `interval` seconds in a daemon thread."""
+    global _sweeper
+    if _sweeper is not None and _sweeper.is_alive():
+        return
+
+    def run():
+        while True:
+            try:
+                sweep()
+            except Exception:
+                logger.exception("Storage sweep failed.")
+            if _stop.wait(interval):
+                return
+
+    _stop.clear()
+    _sweeper = threading.Thread(target=run, name="storage-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_sweeper():
+    global _sweeper
+    _stop.set()
+    if _sweeper is not None:
+        _sweeper.join()
+        _sweeper = None
+
+
+@metrics.register_collector
+def _collect_storage():
+    with _lock:
+        references = sum(1 for n in _refs.values() if n > 0)
+    return [
+        ("storage_files", "gauge", "Managed scratch files per area at the last sweep.",
+         [({"area": name}, files) for name, (files, _) in _usage.items()]),
+        ("storage_bytes", "gauge", "Bytes of managed scratch files per area at the last sweep.",
+         [({"area": name}, size) for name, (_, size) in _usage.items()]),
+        ("storage_files_in_use", "gauge", "Files currently referenced by jobs or the API.", [({}, references)]),
+    ]
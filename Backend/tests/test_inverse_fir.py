@@ -0,0 +1,44 @@
+# noise_cleanse/tests/test_inverse_fir.py
+
+"""The Toeplitz inverse FIR engines solve the same problem as a dense least-squares solve."""
+
+import numpy as np
+import pytest
+
+from Backend import live_deconvolution
+
+LENGTH = 256
+LAMBDA = 1e-3
+
+
+@pytest.fixture
+def ir():
+    rng = np.random.default_rng(1)
+    h = rng.standard_normal(400) * np.exp(-np.arange(400) / 60.0)
+    h[0] = 1.0
+    return h
+
+
+def _dense_least_squares(h: np.ndarray, length: int, reg_lambda: float) -> np.ndarray:
+    """min ||conv(h, g) - delta||^2 + lambda ||g||^2 over the full convolution, normalised like compute_inverse_fir."""
+    H = np.zeros((len(h) + length - 1, length))
+    for j in range(length):
+        H[j:j + len(h), j] = h
+    d = np.zeros(H.shape[0])
+    d[0] = 1.0
+    g = np.linalg.solve(H.T @ H + reg_lambda * np.eye(length), H.T @ d)
+    return g / (np.sum(g**2) + 1e-9)
+
+
+@pytest.mark.parametrize("method", ["levinson", "frequency"])
+def test_engine_matches_dense_least_squares(ir, method):
+    expected = _dense_least_squares(ir, LENGTH, LAMBDA)
+    g = live_deconvolution.compute_inverse_fir(ir, LENGTH, LAMBDA, method=method)
+    assert np.max(np.abs(g - expected)) <= 1e-10 * np.max(np.abs(expected))
+
+
+def test_direct_matches_on_zero_padded_ir(ir):
+    padded = np.concatenate((ir, np.zeros(LENGTH - 1)))
+    direct = live_deconvolution.compute_inverse_fir(padded, LENGTH, LAMBDA, method="direct")
+    levinson = live_deconvolution.compute_inverse_fir(ir, LENGTH, LAMBDA, method="levinson")
+    assert np.max(np.abs(direct - levinson)) <= 1e-10 * np.max(np.abs(direct))
@@ -0,0 +1,11 @@
+# noise_cleanse/tests/test_metrics.py
+
+"""Prometheus text rendering stays parseable whatever the label values contain."""
+
+from Backend import metrics
+
+
+def test_label_values_are_escaped():
+    metrics.inc("test_escape_total", session='a"b\\c\nd')
+    line = next(l for l in metrics.render().splitlines() if l.startswith("noisecleanse_test_escape_total{"))
+    assert line == 'noisecleanse_test_escape_total{session="a\\"b\\\\c\\nd"} 1'
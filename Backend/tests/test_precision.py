@@ -0,0 +1,53 @@
+# noise_cleanse/tests/test_precision.py
+
+"""Single vs double precision: dtypes stay float32 end to end and the accuracy loss is bounded."""
+
+import numpy as np
+import pytest
+
+from Backend import fft_engine, impulse_response, offline_deconvolution, spectral_gating
+
+FS = 44100
+TOLERANCE = 1e-4   # max |single - double| relative to the double-precision peak
+
+
+@pytest.fixture
+def inputs():
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal(2 * FS) * 0.1
+    ir = np.zeros(2000)
+    ir[[5, 40, 300]] = [1.0, 0.5, -0.2]
+    ir += rng.standard_normal(len(ir)) * 1e-3
+    return signal, ir
+
+
+def _run(precision: str, signal: np.ndarray, ir: np.ndarray) -> dict:
+    fft_engine.set_precision(precision)
+    try:
+        ir_pre = impulse_response.preprocess_ir(ir, FS)
+        blocks = [signal[i:i + 5000] for i in range(0, len(signal), 5000)]
+        return {
+            "preprocess_ir": ir_pre,
+            "offline": offline_deconvolution.offline_deconvolve(signal, ir_pre, FS),
+            "gate": spectral_gating.gate_signal(signal, FS),
+            "gate_stream": np.concatenate(list(spectral_gating.gate_stream(blocks, FS))),
+            "gate_block": spectral_gating.SpectralGate(FS).process_block(signal[:4096]),
+        }
+    finally:
+        fft_engine.set_precision("double")
+
+
+def _relative_error(single: np.ndarray, double: np.ndarray) -> float:
+    return float(np.max(np.abs(single - double)) / np.max(np.abs(double)))
+
+
+def test_single_precision_stays_float32(inputs):
+    for name, out in _run("single", *inputs).items():
+        assert out.dtype == np.float32, name
+
+
+def test_single_precision_accuracy(inputs):
+    single, double = _run("single", *inputs), _run("double", *inputs)
+    for name in ("offline", "gate", "gate_stream"):
+        assert single[name].shape == double[name].shape, name
+        assert _relative_error(single[name], double[name]) < TOLERANCE, name
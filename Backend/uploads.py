@@ -0,0 +1,362 @@
+# noise_cleanse/uploads.py
+
+"""
+Streaming upload decoding for the REST API.
+
+Request bodies (multipart/form-data, or a raw audio body) are parsed as they
+arrive and WAV parts are decoded chunk by chunk: large parts such as signals
+into a float32 WAV scratch file under UPLOAD_DIR that readers memory-map,
+small parts such as IRs straight into memory. Scratch files are named after
+their samples, so identical uploads share one file, and are reference-counted
+by the storage manager, which deletes them once unused and expired. Formats the incremental WAV
+decoder does not handle are spooled to an anonymous temporary file and
+decoded with soundfile. Bodies over UPLOAD_MAX_BYTES are rejected.
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import uuid
+
+import numpy as np
+import soundfile as sf
+
+from . import config, storage
+from .audio_io import AudioSource, AudioWriter
+from .cache import content_key
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when a request body exceeds UPLOAD_MAX_BYTES."""
+
+
+class UploadFormatError(ValueError):
+    """Raised when an upload cannot be decoded as audio."""
+
+
+_PCM = {8: np.uint8, 16: np.dtype("<i2"), 32: np.dtype("<i4")}
+_FLOAT = {32: np.dtype("<f4"), 64: np.dtype("<f8")}
+
+
+class WavDecoder:
+    """
+    Incremental RIFF/WAVE parser for PCM (8/16/24/32-bit) and IEEE float data.
+    `feed` returns float32 (frames, channels) blocks as soon as whole frames
+    are available; `ready` is set once the format is known.
+    """
+
+    def __init__(self):
+        self.fs = None
+        self.channels = None
+        self.ready = False
+        self._buf = bytearray()
+        self._state = "riff"
+        self._skip = 0
+        self._remaining = None   # data bytes left; None until the data chunk, -1 if unsized
+        self._bits = None
+        self._float = False
+
+    def _format(self, body: bytes):
+        tag, channels, fs, _, block_align, bits = struct.unpack_from("<HHIIHH", body)
+        if tag == 0xFFFE and len(body) >= 26:
+            tag = struct.unpack_from("<H", body, 24)[0]   # WAVE_FORMAT_EXTENSIBLE subformat
+        supported = (tag == 1 and bits in (8, 16, 24, 32)) or (tag == 3 and bits in _FLOAT)
+        if not supported or block_align != channels * bits // 8:
+            raise UploadFormatError(f"WAV format {tag} ({bits}-bit) is not decoded incrementally.")
+        self.fs, self.channels, self._bits, self._float = fs, channels, bits, tag == 3
+
+    def _convert(self, raw: bytes) -> np.ndarray:
+        if self._float:
+            samples = np.frombuffer(raw, _FLOAT[self._bits]).astype(np.float32)
+        elif self._bits == 24:
+            padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+            padded[:, 1:] = np.frombuffer(raw, np.uint8).reshape(-1, 3)
+            samples = padded.view("<i4")[:, 0].astype(np.float32) / 2.0 ** 31
+        elif self._bits == 8:
+            samples = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128.0) / 128.0
+        else:
+            samples = np.frombuffer(raw, _PCM[self._bits]).astype(np.float32) / 2.0 ** (self._bits - 1)
+        return samples.reshape(-1, self.channels)
+
+    def feed(self, data: bytes) -> list:
+        self._buf += data
+        blocks = []
+        while True:
+            if self._state == "riff":
+                if len(self._buf) < 12:
+                    break
+                if self._buf[:4] != b"RIFF" or self._buf[8:12] != b"WAVE":
+                    raise UploadFormatError("Not a RIFF/WAVE stream.")
+                del self._buf[:12]
+                self._state = "chunk"
+            elif self._state == "chunk":
+                if len(self._buf) < 8:
+                    break
+                chunk_id, size = bytes(self._buf[:4]), struct.unpack_from("<I", self._buf, 4)[0]
+                if chunk_id == b"fmt ":
+                    if len(self._buf) < 8 + size:
+                        break
+                    self._format(bytes(self._buf[8:8 + size]))
+                    del self._buf[:8 + size + size % 2]
+                elif chunk_id == b"data":
+                    if self.fs is None:
+                        raise UploadFormatError("WAV data chunk before fmt chunk.")
+                    del self._buf[:8]
+                    self._remaining = -1 if size in (0, 0xFFFFFFFF) else size
+                    self._state = "data"
+                    self.ready = True
+                else:
+                    del self._buf[:8]
+                    self._skip = size + size % 2
+                    self._state = "skip"
+            elif self._state == "skip":
+                dropped = min(self._skip, len(self._buf))
+                del self._buf[:dropped]
+                self._skip -= dropped
+                if self._skip:
+                    break
+                self._state = "chunk"
+            else:   # data
+                frame_bytes = self.channels * self._bits // 8
+                available = len(self._buf) if self._remaining < 0 else min(len(self._buf), self._remaining)
+                take = available - available % frame_bytes
+                if take:
+                    blocks.append(self._convert(bytes(self._buf[:take])))
+                    del self._buf[:take]
+                    if self._remaining > 0:
+                        self._remaining -= take
+                if self._remaining == 0:
+                    self._state = "chunk"   # trailing chunks (LIST, ...) are skipped
+                    continue
+                break
+        return blocks
+
+    def finish(self):
+        if not self.ready:
+            raise UploadFormatError("WAV stream ended before any audio data.")
+        if self._remaining and self._remaining > 0:
+            logger.warning("WAV upload truncated: %d data bytes missing.", self._remaining)
+
+
+class DecodedUpload:
+    """
+    A decoded upload part: float32 samples in `data`, or in a float WAV at `path`.
+    `digest` is the SHA-1 of the samples (as audio_io.file_digest computes it).
+    """
+
+    def __init__(self, name: str, filename: str, fs: int, channels: int, frames: int,
+                 data: np.ndarray = None, path: str = None, digest: str = None):
+        self.name = name
+        self.filename = filename
+        self.fs = fs
+        self.channels = channels
+        self.frames = frames
+        self.data = data
+        self.path = path
+        self.digest = digest
+
+    def read(self) -> np.ndarray:
+        """Samples as float32, 1-D for mono and (frames, channels) otherwise."""
+        if self.data is None:
+            with AudioSource(self.path) as src:
+                return np.asarray(src.read())
+        return self.data[:, 0] if self.channels == 1 else self.data
+
+    def release(self):
+        """Drop this upload's reference to its scratch file, if any."""
+        if self.path is not None:
+            storage.release(self.path)
+
+
+class _PartDecoder:
+    """Decodes one part; WAV incrementally, anything else via a spooled temporary file."""
+
+    def __init__(self, name: str, filename: str, to_file: bool):
+        self.name = name
+        self.filename = filename
+        self.path = os.path.join(config.UPLOAD_DIR, f"{uuid.uuid4().hex}.tmp.wav") if to_file else None
+        self._wav = WavDecoder()
+        self._header = bytearray()   # raw bytes kept until decoding starts, for the spool fallback
+        self._spool = None
+        self._writer = None
+        self._adopted = None
+        self._blocks = []
+        self._frames = 0
+        self._hash = hashlib.sha1()
+
+    def _open_sink(self, fs: int, channels: int):
+        self.fs, self.channels = fs, channels
+        if self.path is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            storage.acquire(self.path)   # held until renamed, so a sweep cannot remove it mid-write
+            self._writer = AudioWriter(self.path, fs, channels, subtype="FLOAT")
+
+    def _write(self, block: np.ndarray):
+        self._frames += len(block)
+        self._hash.update(np.ascontiguousarray(block))
+        if self._writer is not None:
+            self._writer.write(block)
+        else:
+            self._blocks.append(block)
+
+    def feed(self, data: bytes):
+        if self._spool is not None:
+            self._spool.write(data)
+            return
+        if not self._wav.ready:
+            self._header += data
+        try:
+            blocks = self._wav.feed(data)
+        except UploadFormatError:
+            if self._wav.ready:
+                raise
+            os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+            self._spool = tempfile.TemporaryFile(dir=config.UPLOAD_DIR)
+            self._spool.write(self._header)
+            self._header = None
+            return
+        if self._wav.ready and self._header is not None:
+            self._header = None
+            self._open_sink(self._wav.fs, self._wav.channels)
+        for block in blocks:
+            self._write(block)
+
+    def finish(self) -> DecodedUpload:
+        try:
+            if self._spool is not None:
+                self._spool.seek(0)
+                try:
+                    src = sf.SoundFile(self._spool)
+                except RuntimeError as e:
+                    raise UploadFormatError(f"'{self.filename}' is not a readable audio file: {e}")
+                with src:
+                    self._open_sink(src.samplerate, src.channels)
+                    for block in src.blocks(blocksize=config.AUDIO_CHUNK, dtype="float32", always_2d=True):
+                        self._write(block)
+            else:
+                self._wav.finish()
+        finally:
+            if self._spool is not None:
+                self._spool.close()
+            if self._writer is not None:
+                self._writer.close()
+
+        digest = self._hash.hexdigest()
+        data, path = None, None
+        if self.path is None:
+            data = np.concatenate(self._blocks) if self._blocks else np.zeros((0, self.channels), np.float32)
+            self._blocks = []
+        else:
+            path = self._adopted = storage.adopt(
+                self.path, f"{self.name}_{content_key(digest, self.fs, self.channels)}.wav")
+            storage.release(self.path)
+            self._writer = None
+        return DecodedUpload(self.name, self.filename, self.fs, self.channels, self._frames, data, path, digest)
+
+    def abort(self):
+        if self._spool is not None:
+            self._spool.close()
+        if self._writer is not None:
+            self._writer.close()
+            storage.release(self.path)
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        if self._adopted is not None:
+            storage.release(self._adopted)   # finished, but the request failed afterwards
+
+
+def _multipart_parser():
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ImportError:   # python-multipart < 0.0.13
+        from multipart.multipart import MultipartParser, parse_options_header
+    return MultipartParser, parse_options_header
+
+
+async def receive(request, to_file=("signal",), raw_name: str = "signal",
+                  max_bytes: int = None) -> list:
+    """
+    Decode the audio parts of `request` while it streams in; returns a list of
+    DecodedUpload in body order. Parts named in `to_file` go to scratch WAV
+    files (the caller releases them), others are decoded into memory. A body
+    that is not multipart is decoded as one part called `raw_name` (none if empty).
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    max_bytes = config.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise UploadTooLargeError(f"Upload of {int(length)} bytes exceeds the {max_bytes}-byte limit.")
+
+    parts, decoded = [], []
+    content_type = request.headers.get("content-type", "")
+    MultipartParser, parse_options_header = _multipart_parser()
+    ctype, params = parse_options_header(content_type)
+
+    if ctype == b"multipart/form-data":
+        header = {"field": b"", "value": b""}
+        disposition = {}
+
+        def on_header_field(data, start, end):
+            header["field"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            header["value"] += data[start:end]
+
+        def on_header_end():
+            if header["field"].lower() == b"content-disposition":
+                disposition.update(parse_options_header(header["value"])[1])
+            header["field"] = header["value"] = b""
+
+        def on_headers_finished():
+            name = disposition.get(b"name", b"").decode("utf-8", "replace")
+            filename = disposition.get(b"filename")
+            parts.append(_PartDecoder(name, filename.decode("utf-8", "replace"), name in to_file)
+                         if filename is not None else None)   # plain form fields are ignored
+            disposition.clear()
+
+        def on_part_data(data, start, end):
+            if parts[-1] is not None:
+                parts[-1].feed(bytes(data[start:end]))
+
+        def on_part_end():
+            if parts[-1] is not None:
+                decoded.append(parts[-1].finish())
+
+        parser = MultipartParser(params.get(b"boundary", b""), {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+        write = parser.write
+    else:
+        parts.append(_PartDecoder(raw_name, request.headers.get("x-filename", raw_name), raw_name in to_file))
+        write = parts[-1].feed
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds the {max_bytes}-byte limit.")
+            if chunk:
+                await run_in_threadpool(write, chunk)
+        if ctype != b"multipart/form-data":
+            if received:
+                decoded.append(await run_in_threadpool(parts[-1].finish))
+            else:
+                parts[-1].abort()
+    except Exception:
+        for part in parts:
+            if part is not None:
+                part.abort()
+        raise
+    logger.debug("Decoded %d upload part(s) from %d bytes.", len(decoded), received)
+    return decoded
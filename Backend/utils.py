@@ -1,7 +1,12 @@
 # noise_cleanse/utils.py
 
+import logging
+
 import numpy as np
-from scipy.signal import resample
+
+from . import resampler
+
+logger = logging.getLogger(__name__)
 
 
 def remove_dc(signal: np.ndarray) -> np.ndarray:
@@ -31,9 +36,7 @@ def resample_if_needed(signal: np.ndarray, fs_orig: int, fs_target: int) -> np.n
     """Resample signal to target sampling rate if needed."""
     if fs_orig == fs_target:
         return signal
-    ratio = fs_target / fs_orig
-    new_length = int(len(signal) * ratio)
-    return resample(signal, new_length)
+    return resampler.resample(signal, fs_orig, fs_target)
 
 
 def estimate_snr(signal: np.ndarray, noise_est: float = 1e-4) -> float:
@@ -47,5 +50,5 @@ def auto_lambda_from_ir(ir: np.ndarray, factor: float = 0.01) -> float:
     """Automatically estimate regularization lambda from IR energy."""
     energy = np.sum(ir**2)
     lambda_val = factor * energy
-    print(f"Auto-tuned lambda = {lambda_val:.6f} based on IR energy")
+    logger.debug("Auto-tuned lambda = %.6f based on IR energy", lambda_val)
     return lambda_val
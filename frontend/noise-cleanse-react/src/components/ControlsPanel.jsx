@@ -95,8 +95,12 @@ function ControlsPanel({ setTimePlot, setFreqPlot, setShowResults }) {
   };
 
 const handlePlay = () => {
+  if (!recoveredPath) {
+    setFeedback('Nothing to play yet.');
+    return;
+  }
   const audio = document.createElement('audio');
-  audio.src = "http://localhost:8000/output/recovered_output.wav";
+  audio.src = `http://localhost:8000${recoveredPath}`;
   audio.play().catch((err) => {
     console.error('Playback failed:', err);
     alert('Playback failed.');
@@ -109,7 +113,7 @@ const handlePlay = () => {
       return;
     }
     const link = document.createElement('a');
-    link.href = recoveredPath;
+    link.href = `http://localhost:8000${recoveredPath}?download=true`;
     link.download = 'recovered_output.wav';
     document.body.appendChild(link);
     link.click();